@@ -0,0 +1,226 @@
+"""
+Coalesced like and comment notifications.
+
+Writing one row per like would mean one INSERT per like on a viral post.
+Instead each event only bumps a counter in the ``notifications:pending``
+Redis hash, keyed by recipient, post and kind, and remembers the latest
+actor. The first event of a burst schedules the ``flush_notifications`` job
+``NOTIFICATIONS_FLUSH_INTERVAL`` seconds later, which turns everything
+pending into a few bulk queries: it adds to the recipient's unread digest
+for that post ("alice and 41 other people liked your post") or creates one.
+The flush takes the pending hash and deletes it in one step, so concurrent
+or repeated flushes never apply the same events twice; if the database
+write fails, the events are put back for the next flush.
+
+Unread counts live in ``notifications:unread:{user_id}`` so the navbar
+badge costs one GET. A missing counter is rebuilt from the database; the
+flush only increments counters that exist, and marking notifications read
+drops the counter. Only the notifications a user was shown are marked read.
+The flush locks the unread digests it adds to (SELECT ... FOR UPDATE on the
+primary), so overlapping flushes and ``mark_read`` never lose its counts.
+"""
+
+import logging
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.db import transaction
+from django.db.models import Q
+from django.utils import timezone
+from django_redis import get_redis_connection
+
+from social_media.instrumentation import track
+
+
+logger = logging.getLogger(__name__)
+
+PENDING_KEY = 'notifications:pending'
+FLUSH_LOCK_KEY = 'notifications:flush_lock'
+UNREAD_TIMEOUT = 60 * 60 * 24
+
+# HGETALL and DEL in one step. Returns the hash as a flat field/value list.
+CLAIM_LUA = """
+local pending = redis.call('HGETALL', KEYS[1])
+redis.call('DEL', KEYS[1])
+return pending
+"""
+
+# INCRBY that does not create the key: a missing counter is rebuilt from
+# the database on the next read instead of starting from a wrong value
+INCR_IF_EXISTS_LUA = """
+if redis.call('EXISTS', KEYS[1]) == 1 then
+    return redis.call('INCRBY', KEYS[1], ARGV[1])
+end
+return nil
+"""
+
+
+def unread_key(user_id):
+    return f'notifications:unread:{user_id}'
+
+
+def record_event(recipient_id, post_id, kind, actor_id):
+    """Buffer one like or comment once the transaction commits; own actions are ignored"""
+    if recipient_id is None or recipient_id == actor_id:
+        return
+
+    def record():
+        field = f'{recipient_id}:{post_id}:{kind}'
+        try:
+            conn = get_redis_connection('default')
+            with track('redis'):
+                pipe = conn.pipeline(transaction=False)
+                pipe.hincrby(PENDING_KEY, f'{field}:n', 1)
+                pipe.hset(PENDING_KEY, f'{field}:actor', actor_id)
+                pipe.set(FLUSH_LOCK_KEY, 1, nx=True, ex=settings.NOTIFICATIONS_FLUSH_INTERVAL)
+                *_, flush_due = pipe.execute()
+        except Exception as e:
+            # The like or comment itself is saved; only the notification is lost
+            logger.warning("Could not record notification: %s", e)
+            return
+        if flush_due:
+            from .jobs import flush_notifications
+            # Trailing flush, so the rest of the burst lands in the same batch
+            flush_notifications.defer(settings.NOTIFICATIONS_FLUSH_INTERVAL)
+    transaction.on_commit(record)
+
+
+def flush_pending(batch_size=1000):
+    """Write the buffered events to the database; returns the number of digests"""
+    conn = get_redis_connection('default')
+    with track('redis'):
+        # Read and delete in one step: two flushes never apply the same
+        # events, and events arriving from now on start a new hash
+        claimed = conn.register_script(CLAIM_LUA)(keys=[PENDING_KEY])
+    pending = dict(zip(claimed[::2], claimed[1::2]))
+    if not pending:
+        return 0
+    try:
+        return _flush_batch(conn, pending, batch_size)
+    except Exception:
+        # Nothing was written (one transaction): hand the events back to
+        # the next flush, and let the job retry
+        _restore(conn, pending)
+        raise
+
+
+def _restore(conn, pending):
+    try:
+        with track('redis'):
+            pipe = conn.pipeline(transaction=False)
+            for field, value in pending.items():
+                if field.endswith(b':n'):
+                    pipe.hincrby(PENDING_KEY, field, int(value))
+                else:
+                    # An actor recorded since the claim is newer
+                    pipe.hsetnx(PENDING_KEY, field, value)
+            pipe.execute()
+    except Exception as e:
+        logger.warning("Could not put back %d pending notification fields: %s", len(pending), e)
+
+
+def _flush_batch(conn, pending, batch_size):
+    from posts.models import Post
+    from .models import Notification
+
+    events = {}
+    for field, value in pending.items():
+        recipient_id, post_id, kind, attr = field.decode().split(':')
+        event = events.setdefault((int(recipient_id), int(post_id), kind), {'n': 0, 'actor': None})
+        event[attr] = int(value)
+
+    # Posts or actors deleted since the event was recorded. Read from the
+    # primary: a replica may not have the post or user yet.
+    post_ids = {post_id for _, post_id, _ in events}
+    existing_posts = set(Post.objects.using('default').filter(pk__in=post_ids).values_list('pk', flat=True))
+    actor_ids = {event['actor'] for event in events.values()}
+    existing_actors = set(User.objects.using('default').filter(pk__in=actor_ids).values_list('pk', flat=True))
+    events = {key: event for key, event in events.items() if key[1] in existing_posts and event['n']}
+
+    now = timezone.now()
+    with transaction.atomic(using='default'):
+        # Lock the unread digests until the new counts are committed: an
+        # overlapping flush waits instead of overwriting them, and mark_read()
+        # waits and then sees a count that changed, so the row stays unread
+        unread = {
+            (n.recipient_id, n.post_id, n.kind): n
+            for n in Notification.objects.using('default').select_for_update().filter(
+                is_read=False,
+                recipient_id__in={recipient_id for recipient_id, _, _ in events},
+                post_id__in={post_id for _, post_id, _ in events},
+            )
+        }
+        updated, created = [], []
+        for (recipient_id, post_id, kind), event in events.items():
+            actor_id = event['actor'] if event['actor'] in existing_actors else None
+            notification = unread.get((recipient_id, post_id, kind))
+            if notification is not None:
+                notification.count += event['n']
+                notification.last_actor_id = actor_id or notification.last_actor_id
+                notification.updated_at = now
+                updated.append(notification)
+            else:
+                created.append(Notification(
+                    recipient_id=recipient_id, post_id=post_id, kind=kind,
+                    count=event['n'], last_actor_id=actor_id, updated_at=now,
+                ))
+
+        Notification.objects.bulk_update(updated, ['count', 'last_actor', 'updated_at'], batch_size=batch_size)
+        Notification.objects.bulk_create(created, batch_size=batch_size)
+
+    new_unread = {}
+    for notification in created:
+        new_unread[notification.recipient_id] = new_unread.get(notification.recipient_id, 0) + 1
+    try:
+        with track('redis'):
+            incr = conn.register_script(INCR_IF_EXISTS_LUA)
+            pipe = conn.pipeline(transaction=False)
+            for recipient_id, count in new_unread.items():
+                incr(keys=[unread_key(recipient_id)], args=[count], client=pipe)
+            pipe.execute()
+    except Exception as e:
+        # The rows are committed, so the events must not be put back;
+        # the counters catch up when they expire
+        logger.warning("Could not update unread notification counts: %s", e)
+    return len(events)
+
+
+def unread_count(user_id):
+    """Unread notifications of a user: one Redis GET, one indexed COUNT on a miss"""
+    from .models import Notification
+
+    conn = get_redis_connection('default')
+    try:
+        with track('redis'):
+            count = conn.get(unread_key(user_id))
+        if count is not None:
+            return int(count)
+    except Exception as e:
+        logger.warning("Could not read unread notification count: %s", e)
+        conn = None
+    count = Notification.objects.filter(recipient_id=user_id, is_read=False).count()
+    if conn is not None:
+        try:
+            with track('redis'):
+                conn.set(unread_key(user_id), count, ex=UNREAD_TIMEOUT)
+        except Exception as e:
+            logger.warning("Could not cache unread notification count: %s", e)
+    return count
+
+
+def mark_read(user_id, notifications):
+    """Mark the given notifications read, unless a flush added to them since they were shown"""
+    from .models import Notification
+
+    seen = Q()
+    for notification in notifications:
+        if not notification.is_read:
+            seen |= Q(pk=notification.pk, count=notification.count)
+    if not seen:
+        return
+    Notification.objects.filter(seen, recipient_id=user_id, is_read=False).update(is_read=True)
+    try:
+        with track('redis'):
+            get_redis_connection('default').delete(unread_key(user_id))
+    except Exception as e:
+        logger.warning("Could not reset unread notification count: %s", e)
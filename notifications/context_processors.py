@@ -0,0 +1,9 @@
+from .buffer import unread_count
+
+
+def unread_notifications(request):
+    """``unread_notifications`` for the navbar badge, only looked up if a template uses it"""
+    user = getattr(request, 'user', None)
+    if user is None or not user.is_authenticated:
+        return {}
+    return {'unread_notifications': lambda: unread_count(user.pk)}
@@ -0,0 +1,11 @@
+from social_media.jobs import job
+
+from .buffer import flush_pending
+
+
+@job('flush_notifications')
+def flush_notifications():
+    """Write the coalesced like and comment events to the notifications table"""
+    # Each run claims the pending events atomically, so overlapping or
+    # redelivered runs never write the same events twice
+    flush_pending()
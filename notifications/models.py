@@ -0,0 +1,67 @@
+from django.db import models
+from django.contrib.auth.models import User
+from django.db.models.signals import m2m_changed, post_save
+from django.dispatch import receiver
+from django.utils import timezone
+
+from posts.models import Comment, Post
+from .buffer import record_event
+
+
+class Notification(models.Model):
+    """A digest of likes or comments on one post, e.g. "alice and 4 others liked your post"
+
+    Events are coalesced in Redis and merged into the recipient's unread
+    digest for the same post and kind (see ``notifications.buffer``).
+    """
+    LIKE = 'like'
+    COMMENT = 'comment'
+    KIND_CHOICES = [(LIKE, 'Like'), (COMMENT, 'Comment')]
+
+    recipient = models.ForeignKey(User, on_delete=models.CASCADE, related_name='notifications')
+    post = models.ForeignKey(Post, on_delete=models.CASCADE, related_name='+')
+    kind = models.CharField(max_length=10, choices=KIND_CHOICES)
+    count = models.PositiveIntegerField(default=1)
+    last_actor = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, blank=True, related_name='+')
+    is_read = models.BooleanField(default=False)
+    created_at = models.DateTimeField(auto_now_add=True)
+    # Set explicitly: bulk_update() does not apply auto_now
+    updated_at = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        ordering = ['-updated_at']
+        indexes = [
+            # Notifications page and unread merge: WHERE recipient_id = ? ORDER BY updated_at DESC
+            models.Index(fields=['recipient', '-updated_at'], name='notification_recipient_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.message} ({self.recipient.username})"
+
+    @property
+    def message(self):
+        actor = self.last_actor.username if self.last_actor else 'Someone'
+        if self.count > 1:
+            people = 'person' if self.count == 2 else 'people'
+            actor = f"{actor} and {self.count - 1} other {people}"
+        action = 'liked' if self.kind == self.LIKE else 'commented on'
+        return f'{actor} {action} your post "{self.post.title}"'
+
+
+@receiver(m2m_changed, sender=Post.likes.through)
+def notify_likes(sender, instance, action, reverse, pk_set, **kwargs):
+    if action != 'post_add' or not pk_set:
+        return
+    if reverse:
+        # user.liked_posts.add(*posts)
+        for post_id, author_id in Post.objects.filter(pk__in=pk_set).values_list('pk', 'author_id'):
+            record_event(author_id, post_id, Notification.LIKE, instance.pk)
+    else:
+        for user_id in pk_set:
+            record_event(instance.author_id, instance.pk, Notification.LIKE, user_id)
+
+
+@receiver(post_save, sender=Comment)
+def notify_comment(sender, instance, created, raw=False, **kwargs):
+    if created and not raw:
+        record_event(instance.post.author_id, instance.post_id, Notification.COMMENT, instance.author_id)
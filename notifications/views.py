@@ -0,0 +1,23 @@
+from django.shortcuts import render
+from django.contrib.auth.decorators import login_required
+from django.core.paginator import Paginator
+
+from .buffer import mark_read
+from .models import Notification
+
+
+@login_required
+def notification_list_view(request):
+    notifications = (
+        Notification.objects.filter(recipient=request.user)
+        .select_related('post', 'last_actor')
+    )
+
+    paginator = Paginator(notifications, 20)
+    page_number = request.GET.get('page')
+    page_obj = paginator.get_page(page_number)
+    # Evaluate the page first so it still shows which ones were new, then
+    # mark only what is on it: later pages stay unread
+    mark_read(request.user.pk, list(page_obj))
+
+    return render(request, 'notifications/list.html', {'page_obj': page_obj})
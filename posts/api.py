@@ -0,0 +1,200 @@
+"""
+Read-only JSON API for the feed, post detail and comments.
+
+Responses are compact JSON built from ``.values()`` rows, so no post
+instances are created. Authors come from the Redis user cache in one MGET;
+like/comment counts, like state and image URLs are hydrated for a whole page
+with one query each. Every response carries a strong ETag and
+``If-None-Match`` requests for an unchanged page get an empty 304. The
+comparison is weak, because nginx turns the ETag into ``W/"..."`` when it
+gzips the response and clients send that form back.
+"""
+
+import base64
+import hashlib
+import json
+from datetime import datetime
+from functools import wraps
+
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db.models import Count, Q
+from django.http import HttpResponse, HttpResponseNotModified, JsonResponse
+from django.urls import reverse
+from django.utils.cache import parse_etags
+from django.views.decorators.http import require_GET
+
+from .models import Post, Comment
+from .views import search_posts
+from users.cache import get_profiles, get_users
+
+
+DEFAULT_PAGE_SIZE = 20
+MAX_PAGE_SIZE = 50
+
+POST_FIELDS = ('id', 'title', 'content', 'image', 'created_at', 'updated_at', 'author_id')
+COMMENT_FIELDS = ('id', 'content', 'created_at', 'author_id')
+
+
+def api_login_required(view_func):
+    """Like ``login_required``, but answers 401 instead of redirecting"""
+    @wraps(view_func)
+    def wrapper(request, *args, **kwargs):
+        if not request.user.is_authenticated:
+            return JsonResponse({'error': 'Authentication required'}, status=401)
+        return view_func(request, *args, **kwargs)
+    return wrapper
+
+
+def json_response(request, data):
+    """Serialize compactly and answer 304 if the client already has this body"""
+    body = json.dumps(data, cls=DjangoJSONEncoder, separators=(',', ':')).encode()
+    etag = '"%s"' % hashlib.sha1(body).hexdigest()
+    if_none_match = parse_etags(request.headers.get('If-None-Match', ''))
+    if if_none_match == ['*'] or any(tag.removeprefix('W/') == etag for tag in if_none_match):
+        response = HttpResponseNotModified()
+    else:
+        response = HttpResponse(body, content_type='application/json')
+    response['ETag'] = etag
+    # Clients must revalidate, which is cheap thanks to the ETag
+    response['Cache-Control'] = 'private, no-cache'
+    return response
+
+
+def encode_cursor(created_at, pk):
+    raw = f'{created_at.isoformat()}|{pk}'.encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip('=')
+
+
+def decode_cursor(cursor):
+    """Return (created_at, pk) from a cursor, or None if it is malformed"""
+    try:
+        raw = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)).decode()
+        created_at, pk = raw.split('|')
+        return datetime.fromisoformat(created_at), int(pk)
+    except (ValueError, UnicodeDecodeError):
+        return None
+
+
+def get_page_size(request):
+    try:
+        size = int(request.GET.get('limit', DEFAULT_PAGE_SIZE))
+    except ValueError:
+        size = DEFAULT_PAGE_SIZE
+    return max(1, min(size, MAX_PAGE_SIZE))
+
+
+def paginate(queryset, request, descending):
+    """Keyset pagination on (created_at, id); returns (rows, next_cursor) or None"""
+    cursor = request.GET.get('cursor')
+    if cursor:
+        position = decode_cursor(cursor)
+        if position is None:
+            return None
+        created_at, pk = position
+        if descending:
+            queryset = queryset.filter(Q(created_at__lt=created_at) | Q(created_at=created_at, id__lt=pk))
+        else:
+            queryset = queryset.filter(Q(created_at__gt=created_at) | Q(created_at=created_at, id__gt=pk))
+
+    order = ('-created_at', '-id') if descending else ('created_at', 'id')
+    size = get_page_size(request)
+    rows = list(queryset.order_by(*order)[:size + 1])
+    next_cursor = None
+    if len(rows) > size:
+        rows = rows[:size]
+        next_cursor = encode_cursor(rows[-1]['created_at'], rows[-1]['id'])
+    return rows, next_cursor
+
+
+def image_url_builder():
+    """Return a function mapping an object name to its image proxy URL.
+
+    ``reverse`` is resolved once per response instead of once per image.
+    """
+    placeholder = 'IMAGE_NAME'
+    template = reverse('serve_image', kwargs={'image_name': placeholder})
+    return lambda name: template.replace(placeholder, name) if name else None
+
+
+def hydrate_authors(rows, image_url):
+    """Replace ``author_id`` with a compact author object.
+
+    Users and profiles come from the Redis user cache with one MGET each;
+    only cache misses reach MySQL.
+    """
+    author_ids = {row['author_id'] for row in rows}
+    users = get_users(author_ids)
+    profiles = get_profiles(author_ids)
+    authors = {}
+    for author_id, author in users.items():
+        profile = profiles.get(author_id)
+        authors[author_id] = {
+            'id': author.id,
+            'username': author.username,
+            'name': author.get_full_name() or author.username,
+            'avatar': image_url(str(profile.profile_picture) if profile and profile.profile_picture else None),
+        }
+    for row in rows:
+        row['author'] = authors.get(row.pop('author_id'))
+
+
+def serialize_posts(rows, user):
+    """Hydrate a page of post rows in batches"""
+    image_url = image_url_builder()
+    hydrate_authors(rows, image_url)
+
+    post_ids = [row['id'] for row in rows]
+    likes = Post.likes.through.objects.filter(post_id__in=post_ids)
+    like_counts = dict(likes.values('post_id').annotate(n=Count('id')).values_list('post_id', 'n'))
+    liked = set(likes.filter(user_id=user.id).values_list('post_id', flat=True))
+    comment_counts = dict(
+        Comment.objects.filter(post_id__in=post_ids)
+        .values('post_id').annotate(n=Count('id')).values_list('post_id', 'n')
+    )
+
+    for row in rows:
+        row['image'] = image_url(row['image'])
+        row['like_count'] = like_counts.get(row['id'], 0)
+        row['comment_count'] = comment_counts.get(row['id'], 0)
+        row['liked'] = row['id'] in liked
+    return rows
+
+
+@require_GET
+@api_login_required
+def feed_api_view(request):
+    """Feed page: same posts and search as ``post_list_view``"""
+    posts = search_posts(Post.objects.values(*POST_FIELDS), request.GET.get('search', ''))
+    page = paginate(posts, request, descending=True)
+    if page is None:
+        return JsonResponse({'error': 'Invalid cursor'}, status=400)
+    rows, next_cursor = page
+    return json_response(request, {
+        'results': serialize_posts(rows, request.user),
+        'next': next_cursor,
+    })
+
+
+@require_GET
+@api_login_required
+def post_detail_api_view(request, post_id):
+    """Single post: same post as ``post_detail_view``"""
+    rows = list(Post.objects.filter(id=post_id).values(*POST_FIELDS))
+    if not rows:
+        return JsonResponse({'error': 'Post not found'}, status=404)
+    return json_response(request, serialize_posts(rows, request.user)[0])
+
+
+@require_GET
+@api_login_required
+def comments_api_view(request, post_id):
+    """Comments of a post, oldest first, like ``post_detail_view``"""
+    if not Post.objects.filter(id=post_id).exists():
+        return JsonResponse({'error': 'Post not found'}, status=404)
+    comments = Comment.objects.filter(post_id=post_id).values(*COMMENT_FIELDS)
+    page = paginate(comments, request, descending=False)
+    if page is None:
+        return JsonResponse({'error': 'Invalid cursor'}, status=400)
+    rows, next_cursor = page
+    hydrate_authors(rows, image_url_builder())
+    return json_response(request, {'results': rows, 'next': next_cursor})
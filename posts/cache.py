@@ -0,0 +1,31 @@
+"""
+Cached post queries shared by the views and ``manage.py warm_cache``.
+
+Both go through ``social_media.cache.get_or_compute``, so an expired value is
+recomputed by one worker while the others keep serving the previous one.
+"""
+
+from django.core.cache import caches
+
+from social_media.cache import get_or_compute
+
+
+RECENT_POSTS_KEY = 'dashboard:recent_posts'
+FEED_COUNT_KEY = 'feed:count'
+
+
+def recent_posts():
+    """The six newest posts shown on every dashboard"""
+    from .models import Post
+    return get_or_compute(
+        RECENT_POSTS_KEY,
+        lambda: list(Post.objects.select_related('author').order_by('-created_at')[:6]),
+        timeout=15,
+        cache=caches['tiered'],
+    )
+
+
+def feed_count():
+    """Number of posts in the unfiltered feed, for its pagination"""
+    from .models import Post
+    return get_or_compute(FEED_COUNT_KEY, Post.objects.count, timeout=30)
@@ -0,0 +1,6 @@
+from social_media.aio import async_mode
+
+
+def live_counts(request):
+    """``live_counts``: whether pages should open the ``/posts/live/`` stream (ASGI only)"""
+    return {'live_counts': async_mode()}
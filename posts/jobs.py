@@ -0,0 +1,10 @@
+from social_media.jobs import job
+
+from .storage import get_storage
+
+
+@job('delete_image')
+def delete_image(object_name):
+    """Remove an image that no post or profile references any more"""
+    # Deleting a missing object succeeds, so a redelivered job is harmless
+    get_storage().delete(object_name)
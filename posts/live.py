@@ -0,0 +1,194 @@
+"""
+Live like and comment counts over Server-Sent Events.
+
+Whenever likes or comments change, ``publish_counts`` sends the post's new
+count on the ``posts:counts`` Redis channel (after the transaction commits).
+Only under ASGI: sync workers serve no streams, so nothing would listen.
+``like_post_view`` publishes the like count it answers with itself
+(``apublish_like_count``) instead of having the receiver count again.
+
+``event_stream`` feeds ``GET /posts/live/?ids=1,2,3``. Each ASGI worker
+process holds one Redis subscription (``Broadcaster``) and fans the
+messages out to the open streams of the posts they concern. Updates are
+coalesced per post: at most one event per post per ``MIN_INTERVAL`` seconds
+carries the latest counts, however many likes arrive in between. An idle
+stream is only a coroutine waiting on a queue. Streams end after
+``MAX_AGE`` seconds and the browser's ``EventSource`` reconnects, because
+Django 4.2 does not notice clients that went away mid-stream.
+"""
+
+import asyncio
+import json
+import logging
+from collections import defaultdict
+from contextlib import contextmanager
+from contextvars import ContextVar
+from weakref import WeakKeyDictionary
+
+from django.db import transaction
+from django_redis import get_redis_connection
+
+from social_media.aio import async_mode, get_async_redis
+from social_media.instrumentation import track
+
+
+logger = logging.getLogger(__name__)
+
+CHANNEL = 'posts:counts'
+MIN_INTERVAL = 1.0
+HEARTBEAT = 15
+MAX_AGE = 300
+MAX_POSTS = 50
+
+_caller_publishes_likes = ContextVar('live_caller_publishes_likes', default=False)
+
+
+@contextmanager
+def caller_publishes_likes():
+    """Skip publishing like counts from the receivers; the caller publishes its own"""
+    token = _caller_publishes_likes.set(True)
+    try:
+        yield
+    finally:
+        _caller_publishes_likes.reset(token)
+
+
+def publish_counts(post_id, likes=False, comments=False):
+    """Publish the current like and/or comment count of a post once committed"""
+    if not async_mode():
+        return
+    likes = likes and not _caller_publishes_likes.get()
+    if not likes and not comments:
+        return
+
+    def publish():
+        from .models import Comment, Post
+        update = {'id': post_id}
+        if likes:
+            update['likes'] = Post.likes.through.objects.filter(post_id=post_id).count()
+        if comments:
+            update['comments'] = Comment.objects.filter(post_id=post_id).count()
+        try:
+            with track('redis'):
+                get_redis_connection('default').publish(CHANNEL, json.dumps(update))
+        except Exception as e:
+            # Open pages just miss this update
+            logger.warning("Could not publish post counts: %s", e)
+    transaction.on_commit(publish)
+
+
+async def apublish_like_count(post_id, likes):
+    """Publish a like count the caller already has"""
+    if not async_mode():
+        return
+    try:
+        with track('redis'):
+            await get_async_redis().publish(CHANNEL, json.dumps({'id': post_id, 'likes': likes}))
+    except Exception as e:
+        logger.warning("Could not publish post counts: %s", e)
+
+
+class Broadcaster:
+    """One Redis subscription per event loop, fanned out to the open streams"""
+
+    def __init__(self):
+        self.listeners = defaultdict(set)  # post id -> stream queues
+        self.pending = {}                  # post id -> counts not sent yet
+        self.last_sent = {}                # post id -> loop time
+        self.scheduled = set()
+        self.task = None
+
+    def subscribe(self, post_ids):
+        if self.task is None or self.task.done():
+            self.task = asyncio.get_running_loop().create_task(self.listen())
+        queue = asyncio.Queue()
+        for post_id in post_ids:
+            self.listeners[post_id].add(queue)
+        return queue
+
+    def unsubscribe(self, queue, post_ids):
+        for post_id in post_ids:
+            self.listeners[post_id].discard(queue)
+            if not self.listeners[post_id]:
+                del self.listeners[post_id]
+                self.pending.pop(post_id, None)
+                self.last_sent.pop(post_id, None)
+
+    async def listen(self):
+        while True:
+            try:
+                pubsub = get_async_redis().pubsub(ignore_subscribe_messages=True)
+                await pubsub.subscribe(CHANNEL)
+                async for message in pubsub.listen():
+                    self.receive(json.loads(message['data']))
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.warning("Post counts subscriber failed: %s", e)
+                await asyncio.sleep(1)
+
+    def receive(self, update):
+        post_id = update['id']
+        if post_id not in self.listeners:
+            return
+        self.pending.setdefault(post_id, {}).update(update)
+        if post_id in self.scheduled:
+            return
+        loop = asyncio.get_running_loop()
+        due = self.last_sent.get(post_id, 0) + MIN_INTERVAL
+        if loop.time() >= due:
+            self.flush(post_id)
+        else:
+            self.scheduled.add(post_id)
+            loop.call_at(due, self.flush, post_id)
+
+    def flush(self, post_id):
+        self.scheduled.discard(post_id)
+        update = self.pending.pop(post_id, None)
+        if update is None or post_id not in self.listeners:
+            return
+        self.last_sent[post_id] = asyncio.get_running_loop().time()
+        for queue in self.listeners[post_id]:
+            queue.put_nowait(update)
+
+
+_broadcasters = WeakKeyDictionary()
+
+
+def get_broadcaster():
+    loop = asyncio.get_running_loop()
+    if loop not in _broadcasters:
+        _broadcasters[loop] = Broadcaster()
+    return _broadcasters[loop]
+
+
+def parse_post_ids(value):
+    """``'1,2,3'`` -> [1, 2, 3], at most ``MAX_POSTS`` ids; None if invalid"""
+    try:
+        post_ids = list(dict.fromkeys(int(post_id) for post_id in value.split(',') if post_id))
+    except ValueError:
+        return None
+    if not post_ids or len(post_ids) > MAX_POSTS:
+        return None
+    return post_ids
+
+
+async def event_stream(post_ids):
+    """SSE body: one ``data:`` event per coalesced update, plus heartbeats"""
+    broadcaster = get_broadcaster()
+    queue = broadcaster.subscribe(post_ids)
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + MAX_AGE
+    try:
+        # Reconnect quickly after MAX_AGE or a dropped connection
+        yield 'retry: 2000\n\n'
+        while (remaining := deadline - loop.time()) > 0:
+            try:
+                update = await asyncio.wait_for(queue.get(), timeout=min(HEARTBEAT, remaining))
+            except asyncio.TimeoutError:
+                # Keeps proxies from closing the idle connection
+                yield ': keep-alive\n\n'
+                continue
+            yield f'data: {json.dumps(update)}\n\n'
+    finally:
+        broadcaster.unsubscribe(queue, post_ids)
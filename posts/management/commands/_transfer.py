@@ -0,0 +1,151 @@
+"""
+Helpers shared by the export_data, import_data and seed_data commands.
+"""
+
+import gzip
+import time
+from contextlib import contextmanager
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+
+from django.contrib.auth.models import User
+
+from posts.models import Post, Comment
+from users.models import UserProfile
+
+
+# Export order; every model only references models exported before it
+MODELS = {
+    'user': User,
+    'userprofile': UserProfile,
+    'post': Post,
+    'comment': Comment,
+    'like': Post.likes.through,
+}
+
+# Fields holding object storage names
+IMAGE_FIELDS = {
+    'userprofile': 'profile_picture',
+    'post': 'image',
+}
+
+
+def model_fields(model):
+    """Column names to export for a model (``attname`` so FKs are plain ids)"""
+    return [field.attname for field in model._meta.concrete_fields]
+
+
+def stream_rows(model, fields, chunk_size):
+    """Yield rows of a table as dicts with bounded memory.
+
+    Rows are read in primary-key ranges of ``chunk_size``. MySQL client
+    libraries buffer a whole result set, so one ``.iterator()`` over a huge
+    table would not stream; keyset chunks keep every result set small.
+    """
+    pk_name = model._meta.pk.attname
+    queryset = model.objects.order_by(pk_name).values(*fields)
+    last_pk = None
+    while True:
+        chunk = queryset if last_pk is None else queryset.filter(pk__gt=last_pk)
+        count = 0
+        for row in chunk[:chunk_size].iterator(chunk_size=chunk_size):
+            count += 1
+            last_pk = row[pk_name]
+            yield row
+        if count < chunk_size:
+            return
+
+
+def open_data_file(path, mode):
+    """Open a JSONL file, gzip-compressed when it ends in .gz"""
+    if path.endswith('.gz'):
+        return gzip.open(path, mode + 't', encoding='utf-8')
+    return open(path, mode, encoding='utf-8')
+
+
+@contextmanager
+def preserved_timestamps():
+    """Keep explicit created_at/updated_at values instead of auto_now(_add)"""
+    fields = [
+        field for model in MODELS.values() for field in model._meta.concrete_fields
+        if getattr(field, 'auto_now', False) or getattr(field, 'auto_now_add', False)
+    ]
+    saved = [(field, field.auto_now, field.auto_now_add) for field in fields]
+    for field in fields:
+        field.auto_now = field.auto_now_add = False
+    try:
+        yield
+    finally:
+        for field, auto_now, auto_now_add in saved:
+            field.auto_now, field.auto_now_add = auto_now, auto_now_add
+
+
+class Progress:
+    """Counts rows per model and reports rows per second"""
+
+    def __init__(self, stdout, every=100000):
+        self.stdout = stdout
+        self.every = every
+        self.started_at = time.monotonic()
+        self.model_started_at = self.started_at
+        self.model = None
+        self.count = 0
+        self.total = 0
+
+    def start(self, model):
+        self.finish()
+        self.model = model
+        self.count = 0
+        self.model_started_at = time.monotonic()
+
+    def add(self, n=1):
+        before = self.count
+        self.count += n
+        self.total += n
+        if self.count // self.every != before // self.every:
+            self.report()
+
+    def report(self):
+        elapsed = max(time.monotonic() - self.model_started_at, 1e-6)
+        self.stdout.write(f'  {self.model}: {self.count} rows ({self.count / elapsed:,.0f} rows/s)')
+
+    def finish(self):
+        if self.model is not None:
+            self.report()
+            self.model = None
+
+    def summary(self):
+        self.finish()
+        elapsed = max(time.monotonic() - self.started_at, 1e-6)
+        return f'{self.total} rows in {elapsed:.1f}s ({self.total / elapsed:,.0f} rows/s)'
+
+
+class BoundedExecutor:
+    """Thread pool that never holds more than ``limit`` pending tasks.
+
+    Used to copy image objects in parallel while the rows stream by, without
+    queueing millions of futures in memory.
+    """
+
+    def __init__(self, workers):
+        self.executor = ThreadPoolExecutor(max_workers=workers)
+        self.limit = workers * 4
+        self.pending = set()
+        self.done = 0
+        self.failed = 0
+
+    def submit(self, fn, *args):
+        if len(self.pending) >= self.limit:
+            self._collect(wait(self.pending, return_when=FIRST_COMPLETED).done)
+        self.pending.add(self.executor.submit(fn, *args))
+
+    def _collect(self, finished):
+        for future in finished:
+            self.pending.discard(future)
+            if future.exception() is None and future.result() is not False:
+                self.done += 1
+            else:
+                self.failed += 1
+
+    def shutdown(self):
+        self._collect(wait(self.pending).done)
+        self.executor.shutdown()
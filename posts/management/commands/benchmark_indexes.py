@@ -0,0 +1,159 @@
+import json
+import random
+import statistics
+import time
+from datetime import timedelta
+
+from django.contrib.auth.hashers import make_password
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.db.models import Count
+from django.utils import timezone
+
+from posts.models import Post, Comment
+
+
+class Command(BaseCommand):
+    help = (
+        'Benchmark the feed, my-posts and comments queries with and without the '
+        'composite indexes from posts.0002, recording EXPLAIN plans and timings. '
+        'Temporarily drops the indexes: run it against a staging database.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=1000, help='Users to seed (if fewer exist)')
+        parser.add_argument('--posts', type=int, default=100000, help='Posts to seed (if fewer exist)')
+        parser.add_argument('--comments', type=int, default=300000, help='Comments to seed (if fewer exist)')
+        parser.add_argument('--runs', type=int, default=20, help='Timed runs per query')
+        parser.add_argument('--batch-size', type=int, default=5000)
+        parser.add_argument('--output', default='index_benchmark.json', help='Where to write the JSON report')
+
+    def handle(self, *args, **options):
+        self.batch_size = options['batch_size']
+        self.seed(options['users'], options['posts'], options['comments'])
+
+        queries = self.build_queries()
+        report = {
+            'vendor': connection.vendor,
+            'rows': {
+                'users': User.objects.count(),
+                'posts': Post.objects.count(),
+                'comments': Comment.objects.count(),
+            },
+            'queries': {},
+        }
+
+        indexes = [(Post, index) for index in Post._meta.indexes]
+        indexes += [(Comment, index) for index in Comment._meta.indexes]
+
+        self.stdout.write('Dropping composite indexes...')
+        with connection.schema_editor() as schema_editor:
+            for model, index in indexes:
+                schema_editor.remove_index(model, index)
+        try:
+            before = self.measure(queries, options['runs'])
+        finally:
+            self.stdout.write('Restoring composite indexes...')
+            with connection.schema_editor() as schema_editor:
+                for model, index in indexes:
+                    schema_editor.add_index(model, index)
+        after = self.measure(queries, options['runs'])
+
+        for name in queries:
+            report['queries'][name] = {'before': before[name], 'after': after[name]}
+            self.stdout.write(
+                f"{name:12s} median {before[name]['median_ms']:8.2f} ms -> {after[name]['median_ms']:8.2f} ms"
+            )
+
+        with open(options['output'], 'w') as f:
+            json.dump(report, f, indent=2)
+        self.stdout.write(self.style.SUCCESS(f"Report written to {options['output']}"))
+
+    def seed(self, users, posts, comments):
+        """Top up the tables to the requested volumes with bulk inserts"""
+        missing = users - User.objects.count()
+        if missing > 0:
+            self.stdout.write(f'Seeding {missing} users...')
+            password = make_password('benchmark')
+            offset = User.objects.count()
+            User.objects.bulk_create(
+                [User(username=f'bench_user_{offset + i}', password=password) for i in range(missing)],
+                batch_size=self.batch_size,
+            )
+
+        user_ids = list(User.objects.values_list('id', flat=True))
+        now = timezone.now()
+
+        missing = posts - Post.objects.count()
+        if missing > 0:
+            self.stdout.write(f'Seeding {missing} posts...')
+            # A few authors write most of the posts, like on a real site
+            weights = [1 / (rank + 1) for rank in range(len(user_ids))]
+            for start in range(0, missing, self.batch_size):
+                size = min(self.batch_size, missing - start)
+                authors = random.choices(user_ids, weights=weights, k=size)
+                Post.objects.bulk_create([
+                    Post(author_id=author_id, title=f'Benchmark post {start + i}', content='Lorem ipsum ' * 20)
+                    for i, author_id in enumerate(authors)
+                ])
+            # auto_now_add ignores explicit values, so spread created_at afterwards
+            self.spread_created_at(Post, now)
+
+        post_ids = list(Post.objects.values_list('id', flat=True))
+
+        missing = comments - Comment.objects.count()
+        if missing > 0:
+            self.stdout.write(f'Seeding {missing} comments...')
+            weights = [1 / (rank + 1) for rank in range(len(post_ids))]
+            for start in range(0, missing, self.batch_size):
+                size = min(self.batch_size, missing - start)
+                targets = random.choices(post_ids, weights=weights, k=size)
+                Comment.objects.bulk_create([
+                    Comment(post_id=post_id, author_id=random.choice(user_ids), content='Nice post!')
+                    for post_id in targets
+                ])
+            self.spread_created_at(Comment, now)
+
+    def spread_created_at(self, model, now):
+        ids = list(model.objects.values_list('id', flat=True))
+        for start in range(0, len(ids), self.batch_size):
+            batch = [
+                model(id=pk, created_at=now - timedelta(seconds=random.randint(0, 365 * 24 * 3600)))
+                for pk in ids[start:start + self.batch_size]
+            ]
+            model.objects.bulk_update(batch, ['created_at'])
+
+    def build_queries(self):
+        """The same querysets the views run, against the busiest author and post"""
+        busiest_author = (
+            Post.objects.values('author').annotate(n=Count('id')).order_by('-n').first()['author']
+        )
+        busiest_post = (
+            Comment.objects.values('post').annotate(n=Count('id')).order_by('-n').first()['post']
+        )
+        return {
+            # post_list_view, first and a deep page
+            'feed': lambda: Post.objects.select_related('author').all()[:10],
+            'feed_page_50': lambda: Post.objects.select_related('author').all()[490:500],
+            # my_posts_view
+            'my_posts': lambda: Post.objects.filter(author_id=busiest_author).order_by('-created_at')[:10],
+            # post_detail_view
+            'comments': lambda: Comment.objects.filter(post_id=busiest_post).select_related('author').all(),
+        }
+
+    def measure(self, queries, runs):
+        results = {}
+        for name, build in queries.items():
+            list(build())  # warm up caches
+            timings = []
+            for _ in range(runs):
+                start = time.perf_counter()
+                list(build())
+                timings.append((time.perf_counter() - start) * 1000)
+            results[name] = {
+                'explain': build().explain(),
+                'median_ms': statistics.median(timings),
+                'p95_ms': sorted(timings)[max(0, int(len(timings) * 0.95) - 1)],
+            }
+        return results
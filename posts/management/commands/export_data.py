@@ -0,0 +1,55 @@
+import json
+import os
+import shutil
+
+from django.core.management.base import BaseCommand
+from django.core.serializers.json import DjangoJSONEncoder
+
+from posts.storage import get_storage
+from ._transfer import IMAGE_FIELDS, MODELS, BoundedExecutor, Progress, model_fields, open_data_file, stream_rows
+
+
+class Command(BaseCommand):
+    help = (
+        'Export users, profiles, posts, comments and likes as JSONL with constant memory. '
+        'Optionally download the referenced images in parallel.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('output', help='JSONL file to write (gzip-compressed if it ends in .gz)')
+        parser.add_argument('--chunk-size', type=int, default=2000, help='Rows fetched per query')
+        parser.add_argument('--images-dir', help='Also download every referenced image into this directory')
+        parser.add_argument('--workers', type=int, default=8, help='Parallel image downloads')
+
+    def handle(self, *args, **options):
+        images_dir = options['images_dir']
+        copier = None
+        if images_dir:
+            os.makedirs(images_dir, exist_ok=True)
+            storage = get_storage()
+            copier = BoundedExecutor(options['workers'])
+
+            def download(object_name):
+                stream, _ = storage.stream(object_name)
+                try:
+                    with open(os.path.join(images_dir, object_name), 'wb') as destination:
+                        shutil.copyfileobj(stream, destination, 1024 * 1024)
+                finally:
+                    stream.close()
+
+        progress = Progress(self.stdout)
+        with open_data_file(options['output'], 'w') as f:
+            for name, model in MODELS.items():
+                progress.start(name)
+                image_field = IMAGE_FIELDS.get(name)
+                for row in stream_rows(model, model_fields(model), options['chunk_size']):
+                    f.write(json.dumps({'model': name, 'fields': row}, cls=DjangoJSONEncoder, separators=(',', ':')))
+                    f.write('\n')
+                    if copier and image_field and row[image_field]:
+                        copier.submit(download, row[image_field])
+                    progress.add()
+
+        self.stdout.write(self.style.SUCCESS(f'Exported {progress.summary()}'))
+        if copier:
+            copier.shutdown()
+            self.stdout.write(f'Images: {copier.done} downloaded, {copier.failed} failed')
@@ -0,0 +1,90 @@
+import json
+import mimetypes
+import os
+
+from django.core.management.base import BaseCommand, CommandError
+from django.core.management.color import no_style
+from django.db import connection
+
+from posts.storage import get_storage
+from ._transfer import IMAGE_FIELDS, MODELS, BoundedExecutor, Progress, open_data_file, preserved_timestamps
+
+
+class Command(BaseCommand):
+    help = (
+        'Import a JSONL file written by export_data using batched bulk_create. '
+        'Optionally upload the exported images to object storage in parallel.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('input', help='JSONL file to read (gzip-compressed if it ends in .gz)')
+        parser.add_argument('--batch-size', type=int, default=1000, help='Rows per bulk_create')
+        parser.add_argument('--images-dir', help='Upload the images found in this directory')
+        parser.add_argument('--workers', type=int, default=8, help='Parallel image uploads')
+        parser.add_argument(
+            '--ignore-conflicts', action='store_true',
+            help='Skip rows whose primary key already exists (for resuming an import)'
+        )
+
+    def handle(self, *args, **options):
+        self.batch_size = options['batch_size']
+        self.ignore_conflicts = options['ignore_conflicts']
+        images_dir = options['images_dir']
+        copier = None
+        if images_dir:
+            storage = get_storage()
+            copier = BoundedExecutor(options['workers'])
+
+            def upload(object_name):
+                path = os.path.join(images_dir, object_name)
+                if not os.path.exists(path):
+                    return False
+                with open(path, 'rb') as f:
+                    storage.put(object_name, f, os.path.getsize(path), mimetypes.guess_type(path)[0])
+
+        progress = Progress(self.stdout)
+        model = None
+        batch = []
+        with preserved_timestamps(), open_data_file(options['input'], 'r') as f:
+            for line_number, line in enumerate(f, 1):
+                try:
+                    record = json.loads(line)
+                    name = record['model']
+                    fields = record['fields']
+                except (ValueError, KeyError):
+                    raise CommandError(f'Line {line_number}: not an export_data record')
+                if name not in MODELS:
+                    raise CommandError(f'Line {line_number}: unknown model {name!r}')
+
+                if MODELS[name] is not model:
+                    self.flush(model, batch, progress)
+                    batch = []
+                    model = MODELS[name]
+                    progress.start(name)
+
+                batch.append(model(**fields))
+                image_field = IMAGE_FIELDS.get(name)
+                if copier and image_field and fields.get(image_field):
+                    copier.submit(upload, fields[image_field])
+                if len(batch) >= self.batch_size:
+                    self.flush(model, batch, progress)
+                    batch = []
+            self.flush(model, batch, progress)
+
+        # Explicit ids were inserted; move sequences past them where needed
+        sequence_sql = connection.ops.sequence_reset_sql(no_style(), list(MODELS.values()))
+        if sequence_sql:
+            with connection.cursor() as cursor:
+                for sql in sequence_sql:
+                    cursor.execute(sql)
+
+        self.stdout.write(self.style.SUCCESS(f'Imported {progress.summary()}'))
+        if copier:
+            copier.shutdown()
+            self.stdout.write(f'Images: {copier.done} uploaded, {copier.failed} missing or failed')
+
+    def flush(self, model, batch, progress):
+        if not batch:
+            return
+        model.objects.bulk_create(batch, batch_size=self.batch_size, ignore_conflicts=self.ignore_conflicts)
+        progress.add(len(batch))
@@ -0,0 +1,229 @@
+import json
+import random
+import re
+import threading
+import time
+from collections import defaultdict
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+from django.test import Client
+from django.utils import timezone
+
+from posts.models import Post
+from .seed_data import WORDS, zipf_cum_weights
+
+
+# Endpoint name -> default weight in the traffic mix
+DEFAULT_MIX = {
+    'feed': 40,
+    'detail': 30,
+    'like': 10,
+    'search': 10,
+    'image': 10,
+}
+
+CSRF_TOKEN_RE = re.compile(r'name="csrfmiddlewaretoken" value="([^"]+)"')
+
+
+def percentile(sorted_values, pct):
+    """Nearest-rank percentile of an already sorted list"""
+    if not sorted_values:
+        return None
+    index = max(0, min(len(sorted_values) - 1, int(round(pct / 100 * len(sorted_values))) - 1))
+    return sorted_values[index]
+
+
+def parse_mix(value):
+    mix = {}
+    for item in value.split(','):
+        name, _, weight = item.partition('=')
+        if name not in DEFAULT_MIX or not weight.isdigit():
+            raise CommandError(f'Invalid --mix entry {item!r}; use e.g. feed=40,detail=30')
+        mix[name] = int(weight)
+    return mix
+
+
+class TestClientSession:
+    """Sends requests in-process through the Django test client"""
+
+    def __init__(self, username, password):
+        self.client = Client()
+        response = self.client.post('/login/', {'username': username, 'password': password})
+        if response.status_code != 302:
+            raise CommandError(f'Could not log in as {username}')
+
+    def request(self, method, path):
+        response = getattr(self.client, method.lower())(path)
+        if hasattr(response, 'streaming_content'):
+            for _ in response.streaming_content:
+                pass
+        return response.status_code
+
+
+class HTTPSession:
+    """Sends requests to a running server (e.g. gunicorn on localhost)"""
+
+    def __init__(self, base_url, username, password):
+        import requests
+
+        self.base_url = base_url.rstrip('/')
+        self.session = requests.Session()
+        token = self.csrf_token('/login/')
+        response = self.session.post(
+            self.base_url + '/login/',
+            data={'username': username, 'password': password, 'csrfmiddlewaretoken': token},
+            headers={'Referer': self.base_url + '/login/'},
+            allow_redirects=False,
+        )
+        if response.status_code != 302:
+            raise CommandError(f'Could not log in as {username}')
+        # The CSRF token is rotated on login
+        self.token = self.csrf_token('/posts/create/')
+
+    def csrf_token(self, path):
+        match = CSRF_TOKEN_RE.search(self.session.get(self.base_url + path).text)
+        return match.group(1) if match else ''
+
+    def request(self, method, path):
+        headers = {'X-CSRFToken': self.token, 'Referer': self.base_url + path} if method == 'POST' else {}
+        response = self.session.request(method, self.base_url + path, headers=headers, allow_redirects=False)
+        return response.status_code
+
+
+class Command(BaseCommand):
+    help = (
+        'Replay weighted traffic (feed, detail, like, search, image) against the views and '
+        'report throughput and p50/p95/p99 latency per endpoint.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--duration', type=float, default=30, help='Seconds to run')
+        parser.add_argument('--concurrency', type=int, default=4, help='Concurrent simulated users')
+        parser.add_argument(
+            '--mix', type=parse_mix, default=DEFAULT_MIX,
+            help='Traffic weights, e.g. feed=40,detail=30,like=10,search=10,image=10'
+        )
+        parser.add_argument(
+            '--base-url',
+            help='Send real HTTP requests to this server instead of using the in-process test client'
+        )
+        parser.add_argument('--password', default='loadtest123', help='Password of the seed_* users')
+        parser.add_argument('--zipf', type=float, default=1.1, help='Zipf exponent of post popularity')
+        parser.add_argument('--output', help='Write the results as JSON to this file')
+
+    def handle(self, *args, **options):
+        usernames = list(
+            User.objects.filter(username__startswith='seed_')
+            .values_list('username', flat=True)[:options['concurrency']]
+        )
+        if len(usernames) < options['concurrency']:
+            raise CommandError('Not enough seed_* users; run "manage.py seed_data" first')
+
+        recent = list(Post.objects.order_by('-created_at').values_list('id', 'image')[:5000])
+        if not recent:
+            raise CommandError('No posts; run "manage.py seed_data" first')
+        self.post_ids = [post_id for post_id, _ in recent]
+        self.cum_weights = zipf_cum_weights(len(self.post_ids), options['zipf'])
+        self.images = [image for _, image in recent if image]
+        self.page_count = max(1, len(self.post_ids) // 10)
+
+        mix = {name: weight for name, weight in options['mix'].items() if weight}
+        if not self.images:
+            mix.pop('image', None)
+        self.endpoints = list(mix)
+        self.weights = [mix[name] for name in self.endpoints]
+
+        self.latencies = defaultdict(list)
+        self.errors = defaultdict(int)
+        self.lock = threading.Lock()
+        self.deadline = time.monotonic() + options['duration']
+
+        self.stdout.write(
+            f"Running {options['concurrency']} users for {options['duration']:.0f}s "
+            f"({'HTTP ' + options['base_url'] if options['base_url'] else 'in-process test client'})..."
+        )
+        started = time.monotonic()
+        threads = [
+            threading.Thread(target=self.run_user, args=(username, options))
+            for username in usernames
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        elapsed = time.monotonic() - started
+
+        results = self.summarize(elapsed)
+        self.print_results(results)
+        if options['output']:
+            results['options'] = {
+                key: options[key] for key in ('duration', 'concurrency', 'mix', 'base_url', 'zipf')
+            }
+            results['finished_at'] = timezone.now().isoformat()
+            with open(options['output'], 'w') as f:
+                json.dump(results, f, indent=2)
+            self.stdout.write(self.style.SUCCESS(f"Results written to {options['output']}"))
+
+    def next_request(self):
+        endpoint = random.choices(self.endpoints, weights=self.weights)[0]
+        if endpoint == 'feed':
+            # Most readers stay on the first pages
+            page = min(self.page_count, int(random.paretovariate(1.5)))
+            return endpoint, 'GET', f'/posts/?page={page}'
+        if endpoint == 'search':
+            return endpoint, 'GET', f'/posts/?search={random.choice(WORDS)}'
+        if endpoint == 'image':
+            return endpoint, 'GET', f'/posts/images/{random.choice(self.images)}/'
+        post_id = random.choices(self.post_ids, cum_weights=self.cum_weights)[0]
+        if endpoint == 'like':
+            return endpoint, 'POST', f'/posts/{post_id}/like/'
+        return endpoint, 'GET', f'/posts/{post_id}/'
+
+    def run_user(self, username, options):
+        try:
+            if options['base_url']:
+                session = HTTPSession(options['base_url'], username, options['password'])
+            else:
+                session = TestClientSession(username, options['password'])
+
+            while time.monotonic() < self.deadline:
+                endpoint, method, path = self.next_request()
+                start = time.perf_counter()
+                try:
+                    status = session.request(method, path)
+                except Exception:
+                    status = None
+                latency = (time.perf_counter() - start) * 1000
+                with self.lock:
+                    self.latencies[endpoint].append(latency)
+                    if status is None or status >= 400:
+                        self.errors[endpoint] += 1
+        finally:
+            connections.close_all()
+
+    def summarize(self, elapsed):
+        endpoints = {}
+        total = 0
+        for endpoint, values in sorted(self.latencies.items()):
+            values.sort()
+            total += len(values)
+            endpoints[endpoint] = {
+                'requests': len(values),
+                'errors': self.errors[endpoint],
+                'rps': len(values) / elapsed,
+                'p50_ms': percentile(values, 50),
+                'p95_ms': percentile(values, 95),
+                'p99_ms': percentile(values, 99),
+            }
+        return {'elapsed_s': elapsed, 'requests': total, 'rps': total / elapsed, 'endpoints': endpoints}
+
+    def print_results(self, results):
+        self.stdout.write(f"{'endpoint':10s} {'reqs':>7s} {'errors':>7s} {'rps':>8s} {'p50':>8s} {'p95':>8s} {'p99':>8s}")
+        for endpoint, stats in results['endpoints'].items():
+            self.stdout.write(
+                f"{endpoint:10s} {stats['requests']:7d} {stats['errors']:7d} {stats['rps']:8.1f} "
+                f"{stats['p50_ms']:8.1f} {stats['p95_ms']:8.1f} {stats['p99_ms']:8.1f}"
+            )
+        self.stdout.write(f"Total: {results['requests']} requests, {results['rps']:.1f} req/s")
@@ -0,0 +1,50 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from social_media.profiling import folded_stacks, get_profile, list_profiles
+
+
+class Command(BaseCommand):
+    help = 'List stored request profiles or dump one as folded stacks for flamegraph tools'
+
+    def add_arguments(self, parser):
+        subparsers = parser.add_subparsers(dest='action', required=True)
+
+        list_parser = subparsers.add_parser('list', help='List recent profiles')
+        list_parser.add_argument('--limit', type=int, default=20)
+
+        dump_parser = subparsers.add_parser('dump', help='Dump a profile as folded stacks')
+        dump_parser.add_argument('profile_id')
+        dump_parser.add_argument(
+            '--output', '-o',
+            help='Write to this file instead of stdout (e.g. for flamegraph.pl or speedscope)'
+        )
+
+    def handle(self, *args, **options):
+        if options['action'] == 'list':
+            self.list_profiles(options['limit'])
+        else:
+            self.dump_profile(options['profile_id'], options['output'])
+
+    def list_profiles(self, limit):
+        profiles = list_profiles(limit)
+        if not profiles:
+            self.stdout.write('No stored profiles.')
+            return
+        for profile in profiles:
+            self.stdout.write(
+                f"{profile['id']}  {profile['created_at']}  {profile['duration'] * 1000:8.1f} ms  "
+                f"{profile['samples']:5d} samples  {profile['status']}  {profile['method']} {profile['path']}"
+            )
+
+    def dump_profile(self, profile_id, output):
+        profile = get_profile(profile_id)
+        if profile is None:
+            raise CommandError(f'Profile {profile_id} not found (it may have expired)')
+
+        folded = folded_stacks(profile)
+        if output:
+            with open(output, 'w') as f:
+                f.write(folded)
+            self.stdout.write(self.style.SUCCESS(f'Wrote {len(profile["stacks"])} stacks to {output}'))
+        else:
+            self.stdout.write(folded, ending='')
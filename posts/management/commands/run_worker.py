@@ -0,0 +1,96 @@
+import logging
+import multiprocessing
+import signal
+import threading
+
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections, connections
+from django.utils.module_loading import autodiscover_modules
+
+from social_media.jobs import Queue, perform, registry
+
+
+logger = logging.getLogger(__name__)
+
+
+class Command(BaseCommand):
+    help = (
+        'Run background jobs from the Redis job queue (see social_media/jobs.py) '
+        'with a pool of threads or processes. Stops after the running jobs on SIGTERM.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--queue', default='default')
+        parser.add_argument('--concurrency', type=int, default=4, help='Jobs run at the same time')
+        parser.add_argument(
+            '--pool', choices=['thread', 'process'], default='thread',
+            help='Threads suit I/O-bound jobs such as object storage calls'
+        )
+        parser.add_argument('--poll-interval', type=float, default=1.0, help='Seconds to wait when idle')
+        parser.add_argument('--stats', action='store_true', help='Print the queue sizes and exit')
+        parser.add_argument('--requeue-dead', action='store_true', help='Retry every dead job and exit')
+
+    def handle(self, *args, **options):
+        # Import every app's jobs module so the worker knows all job names
+        autodiscover_modules('jobs')
+        self.queue_name = options['queue']
+        self.poll_interval = options['poll_interval']
+
+        if options['stats']:
+            for name, count in Queue(self.queue_name).stats().items():
+                self.stdout.write(f'{name}: {count}')
+            return
+        if options['requeue_dead']:
+            count = Queue(self.queue_name).requeue_dead()
+            self.stdout.write(self.style.SUCCESS(f'Requeued {count} dead jobs'))
+            return
+
+        if options['pool'] == 'process':
+            # Forked children must not share the parent's database connection
+            connections.close_all()
+            context = multiprocessing.get_context('fork')
+            self.stop = context.Event()
+            workers = [context.Process(target=self.work) for _ in range(options['concurrency'])]
+        else:
+            self.stop = threading.Event()
+            workers = [threading.Thread(target=self.work) for _ in range(options['concurrency'])]
+
+        signal.signal(signal.SIGTERM, self.shutdown)
+        signal.signal(signal.SIGINT, self.shutdown)
+
+        self.stdout.write(
+            f"Worker for queue {self.queue_name!r} ({options['pool']} pool of {options['concurrency']}), "
+            f"jobs: {', '.join(sorted(registry))}"
+        )
+        for worker in workers:
+            worker.start()
+        for worker in workers:
+            worker.join()
+        self.stdout.write('Worker stopped')
+
+    def shutdown(self, signum, frame):
+        self.stop.set()
+
+    def work(self):
+        queue = Queue(self.queue_name)
+        while not self.stop.is_set():
+            try:
+                payload = queue.claim()
+            except Exception as e:
+                logger.warning("Could not claim a job: %s", e)
+                self.stop.wait(self.poll_interval)
+                continue
+            if payload is None:
+                self.stop.wait(self.poll_interval)
+                continue
+
+            close_old_connections()
+            try:
+                perform(queue, payload)
+            except Exception as e:
+                # Redis went away while reporting; the job is redelivered
+                # after the visibility timeout
+                logger.warning("Could not finish job %s: %s", payload['id'], e)
+            finally:
+                close_old_connections()
+        connections.close_all()
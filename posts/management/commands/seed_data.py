@@ -0,0 +1,169 @@
+import itertools
+import os
+import random
+import tempfile
+from datetime import timedelta
+
+from django.contrib.auth.hashers import make_password
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand
+from django.db.models import Max
+from django.utils import timezone
+
+from posts.models import Post, Comment
+from posts.utils import upload_to_minio
+from users.models import UserProfile
+from ._transfer import Progress, preserved_timestamps
+
+
+WORDS = (
+    'django python redis minio mysql docker nginx kubernetes coffee weekend travel music '
+    'photo sunset cat dog garden recipe football running book movie city beach mountain'
+).split()
+
+
+def sentence(words):
+    return ' '.join(random.choice(WORDS) for _ in range(words)).capitalize()
+
+
+def zipf_cum_weights(n, exponent):
+    """Cumulative Zipf weights for ranks 1..n, for fast ``random.choices``"""
+    return list(itertools.accumulate(1 / (rank ** exponent) for rank in range(1, n + 1)))
+
+
+class Command(BaseCommand):
+    help = (
+        'Generate synthetic users, posts, comments and likes with bulk_create. '
+        'Likes and comments follow a Zipf distribution over posts.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=1000)
+        parser.add_argument('--posts', type=int, default=10000)
+        parser.add_argument('--comments', type=int, default=30000)
+        parser.add_argument('--likes', type=int, default=50000)
+        parser.add_argument('--zipf', type=float, default=1.1, help='Zipf exponent of post popularity')
+        parser.add_argument('--days', type=int, default=90, help='Spread created_at over this many days')
+        parser.add_argument('--images', type=int, default=0, help='Placeholder images to upload to object storage')
+        parser.add_argument('--image-ratio', type=float, default=0.3, help='Fraction of posts with an image')
+        parser.add_argument('--password', default='loadtest123', help='Password of every generated user')
+        parser.add_argument('--batch-size', type=int, default=2000)
+
+    def handle(self, *args, **options):
+        self.batch_size = options['batch_size']
+        self.now = timezone.now()
+        self.span = options['days'] * 24 * 3600
+        progress = Progress(self.stdout, every=self.batch_size * 10)
+
+        with preserved_timestamps():
+            user_ids = self.create_users(options['users'], options['password'], progress)
+            images = self.upload_images(options['images'])
+            post_ids = self.create_posts(options['posts'], user_ids, images, options['image_ratio'], progress)
+
+            # Popular posts are spread over the whole timeline, not just the newest
+            random.shuffle(post_ids)
+            cum_weights = zipf_cum_weights(len(post_ids), options['zipf'])
+            self.create_comments(options['comments'], post_ids, cum_weights, user_ids, progress)
+            self.create_likes(options['likes'], post_ids, cum_weights, user_ids, progress)
+
+        self.stdout.write(self.style.SUCCESS(f'Generated {progress.summary()}'))
+        self.stdout.write(f"Log in as any seed_* user with password {options['password']!r}")
+
+    def random_time(self):
+        return self.now - timedelta(seconds=random.randint(0, self.span))
+
+    def batches(self, total):
+        for start in range(0, total, self.batch_size):
+            yield start, min(self.batch_size, total - start)
+
+    def create_users(self, count, password, progress):
+        progress.start('user')
+        # Hash once; PBKDF2 per user would dominate the run
+        password_hash = make_password(password)
+        prefix = f'seed_{timezone.now():%Y%m%d%H%M%S}_'
+        for start, size in self.batches(count):
+            users = []
+            for i in range(start, start + size):
+                joined = self.random_time()
+                users.append(User(
+                    username=f'{prefix}{i}', password=password_hash, first_name=random.choice(WORDS).title(),
+                    last_name=random.choice(WORDS).title(), email=f'{prefix}{i}@example.com', date_joined=joined,
+                ))
+            User.objects.bulk_create(users)
+            progress.add(size)
+
+        # bulk_create skips the post_save signal that creates profiles, and
+        # MySQL does not return the new ids, so read them back
+        user_ids = list(User.objects.filter(username__startswith=prefix).values_list('id', flat=True))
+        progress.start('userprofile')
+        for start, size in self.batches(len(user_ids)):
+            created = self.random_time()
+            UserProfile.objects.bulk_create([
+                UserProfile(user_id=user_id, bio=sentence(8), created_at=created, updated_at=created)
+                for user_id in user_ids[start:start + size]
+            ])
+            progress.add(size)
+        return user_ids
+
+    def upload_images(self, count):
+        if not count:
+            return []
+        from PIL import Image
+
+        names = []
+        for _ in range(count):
+            color = tuple(random.randint(0, 255) for _ in range(3))
+            fd, path = tempfile.mkstemp(suffix='.jpg')
+            os.close(fd)
+            try:
+                Image.new('RGB', (800, 600), color).save(path, 'JPEG', quality=80)
+                name = upload_to_minio(path)
+                if name:
+                    names.append(name)
+            finally:
+                os.remove(path)
+        self.stdout.write(f'Uploaded {len(names)} placeholder images')
+        return names
+
+    def create_posts(self, count, user_ids, images, image_ratio, progress):
+        progress.start('post')
+        first_new_id = (Post.objects.aggregate(last=Max('id'))['last'] or 0) + 1
+        for start, size in self.batches(count):
+            posts = []
+            for _ in range(size):
+                created = self.random_time()
+                image = random.choice(images) if images and random.random() < image_ratio else None
+                posts.append(Post(
+                    author_id=random.choice(user_ids), title=sentence(5), content=sentence(40),
+                    image=image, created_at=created, updated_at=created,
+                ))
+            Post.objects.bulk_create(posts)
+            progress.add(size)
+        return list(Post.objects.filter(id__gte=first_new_id).values_list('id', flat=True))
+
+    def create_comments(self, count, post_ids, cum_weights, user_ids, progress):
+        progress.start('comment')
+        for start, size in self.batches(count):
+            targets = random.choices(post_ids, cum_weights=cum_weights, k=size)
+            comments = []
+            for post_id in targets:
+                created = self.random_time()
+                comments.append(Comment(
+                    post_id=post_id, author_id=random.choice(user_ids), content=sentence(12),
+                    created_at=created, updated_at=created,
+                ))
+            Comment.objects.bulk_create(comments)
+            progress.add(size)
+
+    def create_likes(self, count, post_ids, cum_weights, user_ids, progress):
+        progress.start('like')
+        Like = Post.likes.through
+        for start, size in self.batches(count):
+            targets = random.choices(post_ids, cum_weights=cum_weights, k=size)
+            pairs = {(post_id, random.choice(user_ids)) for post_id in targets}
+            # A user likes a post at most once; duplicates across batches are skipped
+            Like.objects.bulk_create(
+                [Like(post_id=post_id, user_id=user_id) for post_id, user_id in pairs],
+                ignore_conflicts=True,
+            )
+            progress.add(len(pairs))
@@ -0,0 +1,21 @@
+from django.core.management.base import BaseCommand
+
+from posts.trending import rebase, rebuild
+
+
+class Command(BaseCommand):
+    help = (
+        'Decay and trim the trending scores now (likes and comments already do it '
+        'hourly), or rebuild them from MySQL with --rebuild, e.g. after Redis lost them.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rebuild', action='store_true', help='Recompute the scores from likes and comments')
+
+    def handle(self, *args, **options):
+        if options['rebuild']:
+            count = rebuild()
+            self.stdout.write(self.style.SUCCESS(f'Ranked {count} trending posts'))
+        else:
+            count = rebase()
+            self.stdout.write(self.style.SUCCESS(f'{count} trending posts after decay'))
@@ -0,0 +1,118 @@
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+from django.core.management.base import BaseCommand
+from django.db import connections
+
+from posts.cache import feed_count, recent_posts
+from posts.models import Post
+from posts.storage import get_storage
+from users.cache import get_profiles, get_users
+
+
+class Command(BaseCommand):
+    help = (
+        'Warm Redis, MySQL and object storage after a deploy: the shared feed and '
+        'dashboard values, the first feed pages, their authors and their images. '
+        'Stops starting new batches once --budget seconds have passed.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--pages', type=int, default=5, help='Feed pages to warm')
+        parser.add_argument('--per-page', type=int, default=10, help='Posts per feed page (as in post_list_view)')
+        parser.add_argument('--images', type=int, default=50, help='Most recent images to read from storage')
+        parser.add_argument('--batch-size', type=int, default=100, help='Authors per cache batch')
+        parser.add_argument('--workers', type=int, default=4, help='Batches warmed in parallel')
+        parser.add_argument('--budget', type=float, default=60, help='Time budget in seconds')
+
+    def handle(self, *args, **options):
+        self.started = time.monotonic()
+        self.deadline = self.started + options['budget']
+        self.workers = options['workers']
+        self.skipped = 0
+        self.errors = 0
+
+        self.run('shared values', [feed_count, recent_posts])
+
+        per_page = options['per_page']
+        pages = self.run('feed pages', [
+            lambda offset=offset: self.feed_page(offset, per_page)
+            for offset in range(0, options['pages'] * per_page, per_page)
+        ])
+        posts = [post for page in pages for post in page]
+
+        author_ids = list(dict.fromkeys(post.author_id for post in posts))
+        size = options['batch_size']
+        self.run('authors', [
+            lambda batch=author_ids[i:i + size]: self.authors(batch)
+            for i in range(0, len(author_ids), size)
+        ])
+
+        images = [str(post.image) for post in posts if post.image][:options['images']]
+        self.run('images', [lambda name=name: self.image(name) for name in images])
+
+        elapsed = time.monotonic() - self.started
+        summary = f'Cache warmed in {elapsed:.1f}s ({self.skipped} batches over budget, {self.errors} failed)'
+        if self.skipped or self.errors:
+            self.stdout.write(self.style.WARNING(summary))
+        else:
+            self.stdout.write(self.style.SUCCESS(summary))
+
+    def run(self, step, tasks):
+        """Run ``tasks`` in parallel until the budget is spent; returns their results"""
+        results = []
+        if not tasks:
+            return results
+        if time.monotonic() >= self.deadline:
+            self.skipped += len(tasks)
+            self.stdout.write(f'{step}: skipped, over budget')
+            return results
+
+        done = 0
+        executor = ThreadPoolExecutor(max_workers=self.workers)
+        pending = {executor.submit(self.call, task) for task in tasks}
+        try:
+            while pending:
+                remaining = self.deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                finished, pending = wait(pending, timeout=remaining, return_when=FIRST_COMPLETED)
+                for future in finished:
+                    done += 1
+                    try:
+                        results.append(future.result())
+                    except Exception as e:
+                        self.errors += 1
+                        self.stderr.write(f'{step}: {e}')
+                self.stdout.write(f'{step}: {done}/{len(tasks)}')
+        finally:
+            self.skipped += len(pending)
+            # Batches that have not started are dropped; running ones finish
+            executor.shutdown(wait=False, cancel_futures=True)
+        return results
+
+    def call(self, task):
+        try:
+            return task()
+        finally:
+            # Every worker thread opens its own database connection
+            connections.close_all()
+
+    def feed_page(self, offset, per_page):
+        # Same query as post_list_view, so MySQL has its pages in the buffer pool
+        return list(
+            Post.objects.select_related('author').prefetch_related('likes', 'comments')
+            .order_by('-created_at')[offset:offset + per_page]
+        )
+
+    def authors(self, user_ids):
+        get_users(user_ids)
+        get_profiles(user_ids)
+
+    def image(self, name):
+        stream, _ = get_storage().stream(name)
+        try:
+            while stream.read(64 * 1024):
+                pass
+        finally:
+            stream.close()
@@ -1,10 +1,15 @@
-from django.db import models
+from django.db import models, transaction
 from django.contrib.auth.models import User
 from django.utils import timezone
 from django.core.cache import cache
+from django.db.models.signals import m2m_changed, post_save
+from django.dispatch import receiver
 import uuid
 import os
 
+from .live import publish_counts
+from . import trending
+
 
 class Post(models.Model):
     author = models.ForeignKey(User, on_delete=models.CASCADE, related_name='posts')
@@ -17,6 +22,12 @@ class Post(models.Model):
     
     class Meta:
         ordering = ['-created_at']
+        indexes = [
+            # Feed: ORDER BY created_at DESC
+            models.Index(fields=['-created_at'], name='post_created_idx'),
+            # My posts: WHERE author_id = ? ORDER BY created_at DESC
+            models.Index(fields=['author', '-created_at'], name='post_author_created_idx'),
+        ]
     
     def __str__(self):
         return f"{self.title} by {self.author.username}"
@@ -34,16 +45,16 @@ class Post(models.Model):
         super().save(*args, **kwargs)
     
     def delete(self, *args, **kwargs):
-        # Delete image if it exists
-        if self.image:
-            try:
-                from .utils import delete_from_minio
-                # Convert ImageFieldFile to string for MinIO deletion
-                image_name = str(self.image)
-                delete_from_minio(image_name)
-            except:
-                pass  # Ignore deletion errors
-        super().delete(*args, **kwargs)
+        image_name = str(self.image) if self.image else None
+        post_id = self.pk
+        result = super().delete(*args, **kwargs)
+        trending.remove_post(post_id)
+        # Remove the image from object storage in the background, once the
+        # delete has committed
+        if image_name:
+            from .jobs import delete_image
+            transaction.on_commit(lambda: delete_image.delay(image_name))
+        return result
 
 
 class Comment(models.Model):
@@ -55,6 +66,49 @@ class Comment(models.Model):
     
     class Meta:
         ordering = ['created_at']
+        indexes = [
+            # Post detail: WHERE post_id = ? ORDER BY created_at
+            models.Index(fields=['post', 'created_at'], name='comment_post_created_idx'),
+        ]
     
     def __str__(self):
-        return f"Comment by {self.author.username} on {self.post.title}" 
\ No newline at end of file
+        return f"Comment by {self.author.username} on {self.post.title}"
+
+
+@receiver(m2m_changed, sender=Post.likes.through)
+def publish_like_count(sender, instance, action, reverse, pk_set, **kwargs):
+    if action not in ('post_add', 'post_remove', 'post_clear'):
+        return
+    # user.liked_posts.add(post) arrives with the user as instance
+    post_ids = (pk_set or ()) if reverse else [instance.pk]
+    for post_id in post_ids:
+        publish_counts(post_id, likes=True)
+
+
+@receiver(post_save, sender=Comment)
+def publish_comment_count(sender, instance, created, **kwargs):
+    # Comments are never deleted on their own, and a post_delete receiver
+    # would stop Django from bulk-deleting a post's comments
+    if created:
+        publish_counts(instance.post_id, comments=True)
+
+
+@receiver(m2m_changed, sender=Post.likes.through)
+def update_trending_likes(sender, instance, action, reverse, pk_set, **kwargs):
+    # Each user's like of a post counts once, so toggling it cannot inflate
+    # the score. Unlikes are left to the decay: the like they cancel was
+    # added with the smaller weight of its own time.
+    if action != 'post_add' or not pk_set:
+        return
+    if reverse:
+        for post_id in pk_set:
+            trending.record_event(post_id, trending.LIKE_WEIGHT, liked_by=instance.pk)
+    else:
+        for user_id in pk_set:
+            trending.record_event(instance.pk, trending.LIKE_WEIGHT, liked_by=user_id)
+
+
+@receiver(post_save, sender=Comment)
+def update_trending_comments(sender, instance, created, raw=False, **kwargs):
+    if created and not raw:
+        trending.record_event(instance.post_id, trending.COMMENT_WEIGHT)
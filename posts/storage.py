@@ -0,0 +1,327 @@
+"""
+Object storage backends for post images and profile pictures.
+
+``get_storage()`` returns the backend named by ``settings.OBJECT_STORAGE_BACKEND``:
+
+- ``posts.storage.MinioStorage`` stores objects in the MinIO bucket (default).
+- ``posts.storage.LocalFileSystemStorage`` stores objects under
+  ``settings.LOCAL_STORAGE_ROOT``. Single-node deployments skip the MinIO
+  network hop and images are served with ``sendfile``; benchmarks and tests
+  can run without MinIO.
+
+Async views use ``astream``. ``MinioStorage`` fetches the object over a
+presigned URL with ``httpx``, so waiting on MinIO does not hold a thread;
+other backends read their sync stream in a worker thread.
+"""
+
+import asyncio
+import mimetypes
+import os
+import shutil
+from datetime import timedelta
+from functools import lru_cache
+from weakref import WeakKeyDictionary
+
+import httpx
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.urls import reverse
+from django.utils.module_loading import import_string
+from minio import Minio
+from minio.deleteobjects import DeleteObject
+from minio.error import MinioException
+from urllib3.exceptions import HTTPError as Urllib3HTTPError
+
+from social_media.instrumentation import timed, track
+
+CHUNK_SIZE = 64 * 1024
+
+# What the MinIO client raises: S3 error responses and other bad answers
+# (MinioException), and connection failures such as MaxRetryError (urllib3)
+# or a refused socket (OSError)
+MINIO_ERRORS = (MinioException, Urllib3HTTPError, OSError)
+
+
+class StorageError(Exception):
+    """Raised when the storage backend fails"""
+
+
+class ObjectNotFound(StorageError):
+    """Raised when an object does not exist"""
+
+
+class StorageBackend:
+    """Interface every storage backend implements"""
+
+    def put(self, object_name, fileobj, size=None, content_type=None):
+        """Store the contents of ``fileobj`` under ``object_name``"""
+        raise NotImplementedError
+
+    def stream(self, object_name):
+        """Return ``(fileobj, info)``: a readable, closable file-like object
+        with the contents and the same ``info`` dict as ``stat``"""
+        raise NotImplementedError
+
+    def stat(self, object_name):
+        """Return ``{'size', 'content_type', 'etag'}`` for an object"""
+        raise NotImplementedError
+
+    def delete(self, object_name):
+        """Delete one object; missing objects are not an error"""
+        raise NotImplementedError
+
+    def delete_many(self, object_names):
+        """Delete several objects in as few calls as possible"""
+        for object_name in object_names:
+            self.delete(object_name)
+
+    def presign(self, object_name, expires=timedelta(hours=1)):
+        """Return a URL the object can be fetched from without credentials"""
+        raise NotImplementedError
+
+    def check(self):
+        """Raise ``StorageError`` unless the backend is reachable (readiness probe)"""
+        raise NotImplementedError
+
+    async def astream(self, object_name):
+        """Async ``stream``: return ``(async iterator of chunks, info)``"""
+        fileobj, info = await sync_to_async(self.stream, thread_sensitive=False)(object_name)
+        return _read_in_thread(fileobj), info
+
+
+async def _read_in_thread(fileobj):
+    read = sync_to_async(fileobj.read, thread_sensitive=False)
+    try:
+        while chunk := await read(CHUNK_SIZE):
+            yield chunk
+    finally:
+        await sync_to_async(fileobj.close, thread_sensitive=False)()
+
+
+_http_clients = WeakKeyDictionary()
+
+
+def _http_client():
+    """Shared ``httpx.AsyncClient`` (connection pool) for the running event loop"""
+    loop = asyncio.get_running_loop()
+    client = _http_clients.get(loop)
+    if client is None:
+        client = _http_clients[loop] = httpx.AsyncClient(timeout=10.0)
+    return client
+
+
+async def _iter_response(response):
+    try:
+        async for chunk in response.aiter_bytes(CHUNK_SIZE):
+            yield chunk
+    finally:
+        await response.aclose()
+
+
+class _MinioStream:
+    """File-like wrapper that returns the HTTP connection to the pool on close"""
+
+    def __init__(self, response):
+        self.response = response
+
+    def read(self, amt=None):
+        return self.response.read(amt)
+
+    def close(self):
+        self.response.close()
+        self.response.release_conn()
+
+
+class MinioStorage(StorageBackend):
+    """Objects in the ``settings.MINIO_BUCKET_NAME`` bucket"""
+
+    def __init__(self):
+        self.bucket = settings.MINIO_BUCKET_NAME
+        # The client is thread-safe and keeps a connection pool, so share it
+        self.client = Minio(
+            settings.MINIO_ENDPOINT,
+            access_key=settings.MINIO_ACCESS_KEY,
+            secret_key=settings.MINIO_SECRET_KEY,
+            secure=settings.MINIO_USE_HTTPS
+        )
+        self._bucket_checked = False
+
+    def ensure_bucket(self):
+        if self._bucket_checked:
+            return
+        try:
+            if not self.client.bucket_exists(self.bucket):
+                self.client.make_bucket(self.bucket)
+                print(f"Created bucket: {self.bucket}")
+        except MINIO_ERRORS as e:
+            raise StorageError(e) from e
+        self._bucket_checked = True
+
+    @timed('minio')
+    def put(self, object_name, fileobj, size=None, content_type=None):
+        self.ensure_bucket()
+        try:
+            self.client.put_object(
+                self.bucket, object_name, fileobj,
+                length=size if size is not None else -1,
+                content_type=content_type or 'application/octet-stream',
+                # Required by MinIO when the length is unknown
+                part_size=10 * 1024 * 1024 if size is None else 0,
+            )
+        except MINIO_ERRORS as e:
+            raise StorageError(e) from e
+
+    @timed('minio')
+    def stream(self, object_name):
+        try:
+            response = self.client.get_object(self.bucket, object_name)
+        except MINIO_ERRORS as e:
+            if getattr(e, 'code', None) == 'NoSuchKey':
+                raise ObjectNotFound(object_name) from e
+            raise StorageError(e) from e
+        info = {
+            'size': int(response.headers.get('Content-Length', 0)),
+            'content_type': response.headers.get('Content-Type', 'application/octet-stream'),
+            'etag': response.headers.get('ETag', '').strip('"'),
+        }
+        return _MinioStream(response), info
+
+    async def astream(self, object_name):
+        # Signing is local once the bucket region is known; the first call
+        # looks it up, so do it off the event loop
+        try:
+            url = await sync_to_async(self.client.presigned_get_object, thread_sensitive=False)(
+                self.bucket, object_name, expires=timedelta(minutes=5)
+            )
+        except MINIO_ERRORS as e:
+            raise StorageError(e) from e
+        client = _http_client()
+        try:
+            with track('minio'):
+                response = await client.send(client.build_request('GET', url), stream=True)
+        except httpx.HTTPError as e:
+            raise StorageError(e) from e
+        if response.status_code != 200:
+            await response.aclose()
+            if response.status_code == 404:
+                raise ObjectNotFound(object_name)
+            raise StorageError(f"MinIO returned {response.status_code} for {object_name}")
+        info = {
+            'size': int(response.headers.get('Content-Length', 0)),
+            'content_type': response.headers.get('Content-Type', 'application/octet-stream'),
+            'etag': response.headers.get('ETag', '').strip('"'),
+        }
+        return _iter_response(response), info
+
+    @timed('minio')
+    def check(self):
+        try:
+            # A missing bucket is fine: the first upload creates it
+            self.client.bucket_exists(self.bucket)
+        except MINIO_ERRORS as e:
+            raise StorageError(e) from e
+
+    @timed('minio')
+    def stat(self, object_name):
+        try:
+            result = self.client.stat_object(self.bucket, object_name)
+        except MINIO_ERRORS as e:
+            if getattr(e, 'code', None) == 'NoSuchKey':
+                raise ObjectNotFound(object_name) from e
+            raise StorageError(e) from e
+        return {'size': result.size, 'content_type': result.content_type, 'etag': result.etag}
+
+    @timed('minio')
+    def delete(self, object_name):
+        try:
+            self.client.remove_object(self.bucket, object_name)
+        except MINIO_ERRORS as e:
+            raise StorageError(e) from e
+
+    @timed('minio')
+    def delete_many(self, object_names):
+        # One multi-object delete request; errors are returned lazily
+        errors = self.client.remove_objects(self.bucket, (DeleteObject(name) for name in object_names))
+        try:
+            failed = [error.name for error in errors]
+        except MINIO_ERRORS as e:
+            raise StorageError(e) from e
+        if failed:
+            raise StorageError(f"Could not delete: {', '.join(failed)}")
+
+    @timed('minio')
+    def presign(self, object_name, expires=timedelta(hours=1)):
+        try:
+            return self.client.presigned_get_object(self.bucket, object_name, expires=expires)
+        except MINIO_ERRORS as e:
+            raise StorageError(e) from e
+
+
+class LocalFileSystemStorage(StorageBackend):
+    """Objects as files under ``settings.LOCAL_STORAGE_ROOT``"""
+
+    def __init__(self):
+        self.root = os.path.abspath(settings.LOCAL_STORAGE_ROOT)
+        os.makedirs(self.root, exist_ok=True)
+
+    def path(self, object_name):
+        path = os.path.abspath(os.path.join(self.root, object_name))
+        # Refuse names that would escape the root (e.g. "../settings.py")
+        if os.path.commonpath([self.root, path]) != self.root or path == self.root:
+            raise ObjectNotFound(object_name)
+        return path
+
+    def put(self, object_name, fileobj, size=None, content_type=None):
+        path = self.path(object_name)
+        temp_path = f"{path}.part"
+        try:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            with open(temp_path, 'wb') as destination:
+                shutil.copyfileobj(fileobj, destination, 1024 * 1024)
+            os.replace(temp_path, path)
+        except OSError as e:
+            raise StorageError(e) from e
+
+    def _info(self, object_name, result):
+        return {
+            'size': result.st_size,
+            'content_type': mimetypes.guess_type(object_name)[0] or 'application/octet-stream',
+            'etag': f"{result.st_mtime_ns:x}-{result.st_size:x}",
+        }
+
+    def stream(self, object_name):
+        try:
+            # A real file lets FileResponse use wsgi.file_wrapper (sendfile)
+            fileobj = open(self.path(object_name), 'rb')
+        except (FileNotFoundError, IsADirectoryError) as e:
+            raise ObjectNotFound(object_name) from e
+        return fileobj, self._info(object_name, os.fstat(fileobj.fileno()))
+
+    def stat(self, object_name):
+        try:
+            result = os.stat(self.path(object_name))
+        except FileNotFoundError as e:
+            raise ObjectNotFound(object_name) from e
+        return self._info(object_name, result)
+
+    def delete(self, object_name):
+        try:
+            os.remove(self.path(object_name))
+        except (FileNotFoundError, ObjectNotFound):
+            pass
+        except OSError as e:
+            raise StorageError(e) from e
+
+    def presign(self, object_name, expires=timedelta(hours=1)):
+        # Files are only reachable through the Django image view
+        return reverse('serve_image', kwargs={'image_name': object_name})
+
+    def check(self):
+        if not os.access(self.root, os.R_OK | os.W_OK | os.X_OK):
+            raise StorageError(f"{self.root} is not writable")
+
+
+@lru_cache(maxsize=None)
+def get_storage():
+    """Return the configured storage backend (one instance per process)"""
+    return import_string(settings.OBJECT_STORAGE_BACKEND)()
@@ -0,0 +1,210 @@
+"""
+Trending posts, ranked incrementally in a Redis sorted set.
+
+Every like adds ``LIKE_WEIGHT`` and every comment ``COMMENT_WEIGHT`` to the
+post's score in ``posts:trending``. A like counts only the first time a user
+likes the post: the users already counted are kept in
+``posts:trending:liked:<post id>``, so unliking and liking again adds
+nothing. Unlikes leave the score alone and the like fades with the decay
+(its weight at the time it was added is not known any more).
+An event's weight halves every ``TRENDING_HALF_LIFE_HOURS``. Instead of
+lowering every score as time passes, new events are worth more: an event
+at time ``t`` adds ``weight * 2 ** ((t - epoch) / half_life)``, which keeps
+the ranking the same as decaying everything (forward decay). Once the
+epoch (``posts:trending:epoch``) is ``REBASE_INTERVAL`` seconds old, the
+next event scales every score down to a new epoch so they stay small, drops
+posts that went cold and keeps the ``MAX_SIZE`` hottest. The scores are
+updated and rebased atomically in one Lua script.
+
+``TrendingPosts`` reads a page with ZREVRANGEBYSCORE in O(log n + page size).
+``manage.py update_trending`` rebases on demand, or rebuilds the scores
+from MySQL (e.g. after Redis lost them).
+"""
+
+import logging
+import time
+from datetime import datetime, timezone as dt_timezone
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Count
+from django_redis import get_redis_connection
+
+from social_media.instrumentation import track
+
+
+logger = logging.getLogger(__name__)
+
+SCORES_KEY = 'posts:trending'
+EPOCH_KEY = 'posts:trending:epoch'
+LIKED_KEY = 'posts:trending:liked:%s'
+LIKE_WEIGHT = 1
+COMMENT_WEIGHT = 3
+REBASE_INTERVAL = 3600
+# Posts scoring below this at a rebase (a single like about four half-lives
+# ago) are dropped
+MIN_SCORE = 0.05
+MAX_SIZE = 1000
+# A like's weight is below MIN_SCORE after about four half-lives, so who
+# liked a post is kept a little longer than that after its last like
+LIKED_HALF_LIVES = 5
+
+# KEYS: scores, epoch[, liked]. ARGV: now, half-life, rebase interval, min
+# score, max size[, post id, weight[, user id, liked ttl]]. With the liked
+# set, the event only counts if the user is not in it yet. Returns the epoch
+# in use.
+UPDATE_LUA = """
+local now = tonumber(ARGV[1])
+local half_life = tonumber(ARGV[2])
+local epoch = tonumber(redis.call('GET', KEYS[2]) or '')
+if not epoch then
+    epoch = now
+    redis.call('SET', KEYS[2], ARGV[1])
+elseif now - epoch >= tonumber(ARGV[3]) then
+    redis.call('ZUNIONSTORE', KEYS[1], 1, KEYS[1], 'WEIGHTS', 2 ^ ((epoch - now) / half_life))
+    redis.call('ZREMRANGEBYSCORE', KEYS[1], '-inf', '(' .. ARGV[4])
+    redis.call('ZREMRANGEBYRANK', KEYS[1], 0, -tonumber(ARGV[5]) - 1)
+    epoch = now
+    redis.call('SET', KEYS[2], ARGV[1])
+end
+if KEYS[3] then
+    if redis.call('SADD', KEYS[3], ARGV[8]) == 0 then
+        return tostring(epoch)
+    end
+    redis.call('EXPIRE', KEYS[3], ARGV[9])
+end
+if ARGV[6] then
+    redis.call('ZINCRBY', KEYS[1], tonumber(ARGV[7]) * 2 ^ ((now - epoch) / half_life), ARGV[6])
+end
+return tostring(epoch)
+"""
+
+_script = None
+
+
+def half_life():
+    return settings.TRENDING_HALF_LIFE_HOURS * 3600
+
+
+def _update(*event, liked_by=None, rebase_interval=REBASE_INTERVAL):
+    global _script
+    conn = get_redis_connection('default')
+    if _script is None:
+        _script = conn.register_script(UPDATE_LUA)
+    keys = [SCORES_KEY, EPOCH_KEY]
+    args = [time.time(), half_life(), rebase_interval, MIN_SCORE, MAX_SIZE, *event]
+    if liked_by is not None:
+        keys.append(LIKED_KEY % event[0])
+        args += [liked_by, round(LIKED_HALF_LIVES * half_life())]
+    with track('redis'):
+        return float(_script(keys=keys, args=args))
+
+
+def record_event(post_id, weight, liked_by=None):
+    """Add ``weight`` to a post's score once the transaction commits.
+
+    With ``liked_by``, only if that user's like of the post was not counted yet.
+    """
+    def record():
+        try:
+            _update(post_id, weight, liked_by=liked_by)
+        except Exception as e:
+            # The like or comment is saved; only its effect on the ranking is lost
+            logger.warning("Could not update trending score: %s", e)
+    transaction.on_commit(record)
+
+
+def remove_post(post_id):
+    def remove():
+        try:
+            with track('redis'):
+                conn = get_redis_connection('default')
+                conn.zrem(SCORES_KEY, post_id)
+                conn.delete(LIKED_KEY % post_id)
+        except Exception as e:
+            logger.warning("Could not remove post from trending: %s", e)
+    transaction.on_commit(remove)
+
+
+def rebase():
+    """Scale the scores to a new epoch and trim them now; returns the number of posts left"""
+    _update(rebase_interval=0)
+    with track('redis'):
+        return get_redis_connection('default').zcard(SCORES_KEY)
+
+
+def rebuild(since_half_lives=5):
+    """Recompute the scores from MySQL; returns the number of posts ranked.
+
+    Comments count at their own time. Likes are not timestamped, so they
+    count at the time their post was created.
+    """
+    from .models import Comment, Post
+
+    now = time.time()
+    cutoff = now - since_half_lives * half_life()
+    scores = {}
+
+    def add(post_id, created_at, weight):
+        scores[post_id] = scores.get(post_id, 0) + weight * 2 ** ((created_at.timestamp() - now) / half_life())
+
+    since = datetime.fromtimestamp(cutoff, tz=dt_timezone.utc)
+    liked = (
+        Post.objects.filter(created_at__gte=since).annotate(like_total=Count('likes'))
+        .filter(like_total__gt=0).values_list('pk', 'created_at', 'like_total')
+    )
+    for post_id, created_at, like_total in liked.iterator():
+        add(post_id, created_at, LIKE_WEIGHT * like_total)
+    for post_id, created_at in Comment.objects.filter(created_at__gte=since).values_list('post_id', 'created_at').iterator():
+        add(post_id, created_at, COMMENT_WEIGHT)
+
+    top = dict(sorted(scores.items(), key=lambda item: item[1], reverse=True)[:MAX_SIZE])
+    conn = get_redis_connection('default')
+    with track('redis'):
+        pipe = conn.pipeline()
+        pipe.delete(SCORES_KEY)
+        if top:
+            pipe.zadd(SCORES_KEY, top)
+        pipe.set(EPOCH_KEY, now)
+        pipe.execute()
+    return len(top)
+
+
+class TrendingPosts:
+    """The trending posts, hottest first, as a sequence ``Paginator`` can page through.
+
+    ``count()`` is a ZCOUNT and a slice is one ZREVRANGEBYSCORE plus one
+    query for its posts, both O(log n). Posts below ``MIN_SCORE`` (gone
+    cold) and posts deleted since they were ranked are left out.
+    """
+
+    def __init__(self, queryset):
+        self.queryset = queryset
+
+    def count(self):
+        try:
+            with track('redis'):
+                return get_redis_connection('default').zcount(SCORES_KEY, MIN_SCORE, '+inf')
+        except Exception as e:
+            logger.warning("Could not read trending posts: %s", e)
+            return 0
+
+    def __len__(self):
+        return self.count()
+
+    def __getitem__(self, index):
+        if not isinstance(index, slice):
+            return self[index:index + 1][0]
+        start = index.start or 0
+        num = -1 if index.stop is None else max(0, index.stop - start)
+        try:
+            with track('redis'):
+                post_ids = get_redis_connection('default').zrevrangebyscore(
+                    SCORES_KEY, '+inf', MIN_SCORE, start=start, num=num
+                )
+        except Exception as e:
+            logger.warning("Could not read trending posts: %s", e)
+            return []
+        post_ids = [int(post_id) for post_id in post_ids]
+        posts = self.queryset.in_bulk(post_ids)
+        return [posts[post_id] for post_id in post_ids if post_id in posts]
@@ -1,13 +1,19 @@
 from django.urls import path
-from . import views
+from . import views, api
 
 urlpatterns = [
     path('', views.post_list_view, name='post_list'),
+    path('trending/', views.trending_posts_view, name='trending_posts'),
     path('create/', views.create_post_view, name='create_post'),
     path('<int:post_id>/', views.post_detail_view, name='post_detail'),
     path('<int:post_id>/like/', views.like_post_view, name='like_post'),
+    path('live/', views.live_counts_view, name='live_counts'),
     path('<int:post_id>/edit/', views.edit_post_view, name='edit_post'),
     path('<int:post_id>/delete/', views.delete_post_view, name='delete_post'),
     path('my-posts/', views.my_posts_view, name='my_posts'),
     path('images/<str:image_name>/', views.serve_image_view, name='serve_image'),
+    # Read-only JSON API
+    path('api/feed/', api.feed_api_view, name='api_feed'),
+    path('api/<int:post_id>/', api.post_detail_api_view, name='api_post_detail'),
+    path('api/<int:post_id>/comments/', api.comments_api_view, name='api_post_comments'),
 ] 
\ No newline at end of file
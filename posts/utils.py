@@ -1,6 +1,7 @@
 from django.conf import settings
 from minio import Minio
-from minio.error import S3Error
+from .storage import get_storage, StorageError
+import mimetypes
 import os
 import uuid
 
@@ -15,63 +16,53 @@ def get_minio_client():
     )
 
 
-def ensure_bucket_exists():
-    """Ensure the MinIO bucket exists"""
+def unique_object_name(filename):
+    """Generate unique object name to avoid conflicts, keeping the extension"""
+    return f"{uuid.uuid4()}{os.path.splitext(filename)[1]}"
+
+
+def store_upload(uploaded_file):
+    """Stream an uploaded file straight to object storage"""
+    object_name = unique_object_name(uploaded_file.name)
     try:
-        client = get_minio_client()
-        if not client.bucket_exists(settings.MINIO_BUCKET_NAME):
-            client.make_bucket(settings.MINIO_BUCKET_NAME)
-            print(f"Created bucket: {settings.MINIO_BUCKET_NAME}")
-    except S3Error as e:
-        print(f"Error ensuring bucket exists: {e}")
+        uploaded_file.seek(0)
+        get_storage().put(object_name, uploaded_file, uploaded_file.size, uploaded_file.content_type)
+        return object_name
+    except StorageError as e:
+        print(f"Error uploading to storage: {e}")
+        return None
 
 
 def upload_to_minio(file_path, object_name=None):
-    """Upload a file to MinIO"""
+    """Upload a local file to object storage"""
+    if object_name is None:
+        object_name = os.path.basename(file_path)
+    unique_name = unique_object_name(object_name)
     try:
-        client = get_minio_client()
-        ensure_bucket_exists()
-        
-        if object_name is None:
-            object_name = os.path.basename(file_path)
-        
-        # Generate unique object name to avoid conflicts
-        file_extension = os.path.splitext(object_name)[1]
-        unique_object_name = f"{uuid.uuid4()}{file_extension}"
-        
-        client.fput_object(
-            settings.MINIO_BUCKET_NAME,
-            unique_object_name,
-            file_path
-        )
-        
-        return unique_object_name
-    except S3Error as e:
-        print(f"Error uploading to MinIO: {e}")
+        with open(file_path, 'rb') as f:
+            get_storage().put(
+                unique_name, f, os.path.getsize(file_path), mimetypes.guess_type(file_path)[0]
+            )
+        return unique_name
+    except StorageError as e:
+        print(f"Error uploading to storage: {e}")
         return None
 
 
 def delete_from_minio(object_name):
-    """Delete a file from MinIO"""
+    """Delete a file from object storage"""
     try:
-        client = get_minio_client()
-        client.remove_object(settings.MINIO_BUCKET_NAME, object_name)
+        get_storage().delete(object_name)
         return True
-    except S3Error as e:
-        print(f"Error deleting from MinIO: {e}")
+    except StorageError as e:
+        print(f"Error deleting from storage: {e}")
         return False
 
 
 def get_minio_url(object_name):
-    """Get the URL for a file stored in MinIO"""
+    """Get a URL for a file in object storage"""
     try:
-        client = get_minio_client()
-        from datetime import timedelta
-        return client.presigned_get_object(
-            settings.MINIO_BUCKET_NAME,
-            object_name,
-            expires=timedelta(hours=1)  # 1 hour
-        )
-    except S3Error as e:
-        print(f"Error getting MinIO URL: {e}")
-        return None 
\ No newline at end of file
+        return get_storage().presign(object_name)
+    except StorageError as e:
+        print(f"Error getting storage URL: {e}")
+        return None
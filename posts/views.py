@@ -1,47 +1,71 @@
 from django.shortcuts import render, redirect, get_object_or_404
 from django.contrib.auth.decorators import login_required
 from django.contrib import messages
-from django.http import JsonResponse, HttpResponse
-from django.core.cache import cache
+from asgiref.sync import sync_to_async
+from django.http import JsonResponse, HttpResponse, FileResponse, Http404, StreamingHttpResponse
 from django.core.paginator import Paginator
+from django.utils.functional import cached_property
+from django.db import transaction
 from django.db.models import Q
+from .cache import feed_count
 from .models import Post, Comment
 from .forms import PostForm, CommentForm
-from .utils import upload_to_minio, delete_from_minio, get_minio_url
-import os
-import requests
+from .jobs import delete_image
+from .live import MAX_POSTS, apublish_like_count, caller_publishes_likes, event_stream, parse_post_ids
+from .storage import get_storage, ObjectNotFound
+from .trending import TrendingPosts
+from .utils import store_upload
+from social_media.aio import async_mode
+from social_media.ratelimit import ratelimit
+from users.cache import attach_profiles, get_session_marker
+from users.decorators import aget_user, async_login_required
 
 
-@login_required
-def serve_image_view(request, image_name):
-    """Proxy view to serve MinIO images through Django"""
+class CachedCountPaginator(Paginator):
+    """Paginator that takes its ``COUNT(*)`` from ``count_func`` (e.g. a cached count)"""
+
+    def __init__(self, object_list, per_page, count_func, **kwargs):
+        super().__init__(object_list, per_page, **kwargs)
+        self.count_func = count_func
+
+    @cached_property
+    def count(self):
+        return self.count_func()
+
+
+@async_login_required
+async def serve_image_view(request, image_name):
+    """Serve images from object storage through Django"""
+    storage = get_storage()
     try:
-        # Get MinIO presigned URL
-        minio_url = get_minio_url(image_name)
-        if not minio_url:
-            return HttpResponse("Image not found", status=404)
-        
-        # Fetch image from MinIO
-        response = requests.get(minio_url, stream=True)
-        if response.status_code != 200:
-            return HttpResponse("Image not found", status=404)
-        
-        # Create Django response with proper headers
-        django_response = HttpResponse(
-            response.content,
-            content_type=response.headers.get('content-type', 'image/jpeg')
-        )
-        
-        # Set cache headers for better performance
-        django_response['Cache-Control'] = 'public, max-age=3600'  # 1 hour cache
-        
-        return django_response
-        
-    except Exception as e:
+        if async_mode():
+            # The event loop serves other requests while MinIO answers
+            stream, info = await storage.astream(image_name)
+        else:
+            stream, info = await sync_to_async(storage.stream, thread_sensitive=False)(image_name)
+    except ObjectNotFound:
+        return HttpResponse("Image not found", status=404)
+    except Exception:
         return HttpResponse("Error serving image", status=500)
+    
+    # Both stream in blocks instead of loading the whole image into memory
+    # (FileResponse uses sendfile for local files under WSGI)
+    if async_mode():
+        response = StreamingHttpResponse(stream, content_type=info['content_type'])
+    else:
+        response = FileResponse(stream, content_type=info['content_type'])
+    response['Content-Length'] = info['size']
+    if info['etag']:
+        response['ETag'] = f'"{info["etag"]}"'
+    
+    # Set cache headers for better performance
+    response['Cache-Control'] = 'public, max-age=3600'  # 1 hour cache
+    
+    return response
 
 
 @login_required
+@ratelimit('upload', rate='10/m')
 def create_post_view(request):
     if request.method == 'POST':
         form = PostForm(request.POST, request.FILES)
@@ -49,25 +73,13 @@ def create_post_view(request):
             post = form.save(commit=False)
             post.author = request.user
             
-            # Handle image upload to MinIO
+            # Handle image upload to object storage
             if 'image' in request.FILES:
-                image_file = request.FILES['image']
-                # Save temporarily to handle MinIO upload
-                import tempfile
-                temp_fd, temp_path = tempfile.mkstemp(suffix=os.path.splitext(image_file.name)[1])
-                with os.fdopen(temp_fd, 'wb') as destination:
-                    for chunk in image_file.chunks():
-                        destination.write(chunk)
-                
-                # Upload to MinIO
-                minio_object_name = upload_to_minio(temp_path)
-                if minio_object_name:
-                    post.image = minio_object_name
-                    # Clean up temp file
-                    os.remove(temp_path)
+                object_name = store_upload(request.FILES['image'])
+                if object_name:
+                    post.image = object_name
                 else:
-                    os.remove(temp_path)
-                    messages.error(request, 'Failed to upload image to MinIO. Please try again.')
+                    messages.error(request, 'Failed to upload image. Please try again.')
                     return render(request, 'posts/create_post.html', {'form': form})
             
             post.save()
@@ -81,11 +93,21 @@ def create_post_view(request):
     return render(request, 'posts/create_post.html', {'form': form})
 
 
+def search_posts(posts, search_query):
+    """Filter a post queryset by the feed search box query"""
+    if not search_query:
+        return posts
+    return posts.filter(
+        Q(title__icontains=search_query) |
+        Q(content__icontains=search_query) |
+        Q(author__username__icontains=search_query)
+    )
+
+
 @login_required
 def post_list_view(request):
-    # Verify session from Redis
-    session_key = f"user_session_{request.user.id}"
-    session_data = cache.get(session_key)
+    # Verify session from Redis (preloaded by SessionPreloadMiddleware)
+    session_data = get_session_marker(request)
     
     if not session_data or not session_data.get('is_authenticated'):
         from django.contrib.auth import logout
@@ -97,28 +119,44 @@ def post_list_view(request):
     
     # Search functionality
     search_query = request.GET.get('search', '')
+    posts = search_posts(posts, search_query)
+    
+    # Pagination; the unfiltered feed is counted at most every 30 seconds
     if search_query:
-        posts = posts.filter(
-            Q(title__icontains=search_query) |
-            Q(content__icontains=search_query) |
-            Q(author__username__icontains=search_query)
-        )
-    
-    # Pagination
-    paginator = Paginator(posts, 10)  # Show 10 posts per page
+        paginator = Paginator(posts, 10)  # Show 10 posts per page
+    else:
+        paginator = CachedCountPaginator(posts, 10, count_func=feed_count)
     page_number = request.GET.get('page')
     page_obj = paginator.get_page(page_number)
     
+    # Author avatars for the whole page from one Redis MGET
+    attach_profiles(post.author for post in page_obj)
+    
     context = {
         'page_obj': page_obj,
         'search_query': search_query,
+        'tab': 'latest',
     }
     return render(request, 'posts/post_list.html', context)
 
 
+@login_required
+def trending_posts_view(request):
+    # Ranked in Redis (see posts/trending.py): ZCOUNT for the page count,
+    # ZREVRANGEBYSCORE for the page's ids, one query for the posts
+    posts = TrendingPosts(Post.objects.select_related('author').prefetch_related('likes', 'comments'))
+    paginator = Paginator(posts, 10)
+    page_number = request.GET.get('page')
+    page_obj = paginator.get_page(page_number)
+
+    attach_profiles(post.author for post in page_obj)
+
+    return render(request, 'posts/post_list.html', {'page_obj': page_obj, 'tab': 'trending'})
+
+
 @login_required
 def post_detail_view(request, post_id):
-    post = get_object_or_404(Post, id=post_id)
+    post = get_object_or_404(Post.objects.select_related('author'), id=post_id)
     comments = post.comments.select_related('author').all()
     
     if request.method == 'POST':
@@ -133,6 +171,8 @@ def post_detail_view(request, post_id):
     else:
         comment_form = CommentForm()
     
+    attach_profiles([post.author] + [comment.author for comment in comments])
+    
     context = {
         'post': post,
         'comments': comments,
@@ -141,63 +181,78 @@ def post_detail_view(request, post_id):
     return render(request, 'posts/post_detail.html', context)
 
 
-@login_required
-def like_post_view(request, post_id):
+@async_login_required
+@ratelimit('like', rate='60/m')
+async def like_post_view(request, post_id):
     if request.method == 'POST':
-        post = get_object_or_404(Post, id=post_id)
+        try:
+            post = await Post.objects.aget(id=post_id)
+        except Post.DoesNotExist:
+            raise Http404("No Post matches the given query.")
         
-        if request.user in post.likes.all():
-            post.likes.remove(request.user)
-            liked = False
-        else:
-            post.likes.add(request.user)
-            liked = True
+        user = await aget_user(request)
+        with caller_publishes_likes():
+            if await post.likes.filter(pk=user.pk).aexists():
+                await post.likes.aremove(user)
+                liked = False
+            else:
+                await post.likes.aadd(user)
+                liked = True
+        like_count = await post.likes.acount()
+        await apublish_like_count(post.pk, like_count)
         
         return JsonResponse({
             'liked': liked,
-            'like_count': post.like_count
+            'like_count': like_count
         })
     
     return JsonResponse({'error': 'Invalid request method'})
 
 
+@async_login_required
+async def live_counts_view(request):
+    """Server-Sent Events with like and comment counts of ``?ids=1,2,3``"""
+    if not async_mode():
+        # A stream would hold a sync worker for its whole lifetime; 204 tells
+        # EventSource not to reconnect
+        return HttpResponse(status=204)
+    post_ids = parse_post_ids(request.GET.get('ids', ''))
+    if post_ids is None:
+        return HttpResponse(f"ids must be 1 to {MAX_POSTS} post ids", status=400)
+    
+    response = StreamingHttpResponse(event_stream(post_ids), content_type='text/event-stream')
+    response['Cache-Control'] = 'no-cache'
+    # Tell nginx to pass events through instead of buffering them
+    response['X-Accel-Buffering'] = 'no'
+    return response
+
+
 @login_required
+@ratelimit('upload', rate='10/m')
 def edit_post_view(request, post_id):
     post = get_object_or_404(Post, id=post_id, author=request.user)
     
     if request.method == 'POST':
         form = PostForm(request.POST, request.FILES, instance=post)
         if form.is_valid():
+            old_image = None
             # Handle new image upload
             if 'image' in request.FILES:
-                # Delete old image if it exists
-                if post.image:
-                    try:
-                        # Convert ImageFieldFile to string for MinIO deletion
-                        image_name = str(post.image)
-                        delete_from_minio(image_name)
-                    except:
-                        pass  # Ignore deletion errors
+                # The form has already put the new file on the instance
+                old_image = Post.objects.filter(id=post.id).values_list('image', flat=True).first()
                 
                 # Upload new image
-                image_file = request.FILES['image']
-                import tempfile
-                temp_fd, temp_path = tempfile.mkstemp(suffix=os.path.splitext(image_file.name)[1])
-                with os.fdopen(temp_fd, 'wb') as destination:
-                    for chunk in image_file.chunks():
-                        destination.write(chunk)
-                
-                # Upload to MinIO
-                minio_object_name = upload_to_minio(temp_path)
-                if minio_object_name:
-                    post.image = minio_object_name
-                    os.remove(temp_path)
-                else:
-                    os.remove(temp_path)
-                    messages.error(request, 'Failed to upload image to MinIO. Please try again.')
+                object_name = store_upload(request.FILES['image'])
+                if not object_name:
+                    messages.error(request, 'Failed to upload image. Please try again.')
                     return render(request, 'posts/edit_post.html', {'form': form, 'post': post})
+                post.image = object_name
             
             form.save()
+            # Delete the old image in the background once the row no longer
+            # points at it
+            if old_image:
+                transaction.on_commit(lambda: delete_image.delay(old_image))
             messages.success(request, 'Post updated successfully!')
             return redirect('post_detail', post_id=post.id)
     else:
@@ -211,15 +266,7 @@ def delete_post_view(request, post_id):
     post = get_object_or_404(Post, id=post_id, author=request.user)
     
     if request.method == 'POST':
-        # Delete image if it exists
-        if post.image:
-            try:
-                # Convert ImageFieldFile to string for MinIO deletion
-                image_name = str(post.image)
-                delete_from_minio(image_name)
-            except:
-                pass  # Ignore deletion errors
-        
+        # Post.delete() also removes the image from object storage
         post.delete()
         messages.success(request, 'Post deleted successfully!')
         return redirect('post_list')
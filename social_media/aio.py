@@ -0,0 +1,50 @@
+"""
+Helpers for async views: async Redis and the server mode.
+
+Under ASGI (``SERVER_MODE=asgi``) ``aget_many`` talks to Redis with
+``redis.asyncio``, so the event loop keeps serving other requests while it
+waits. It reads the same keys and pickled values as ``cache.get_many``.
+Async connection pools belong to one event loop, so each loop gets its own
+client. Under WSGI every async view runs in a short-lived loop, so the
+helpers fall back to the regular cache in a thread instead.
+"""
+
+import asyncio
+from weakref import WeakKeyDictionary
+
+import redis.asyncio
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.cache import caches
+
+from .instrumentation import track
+
+
+_clients = {}
+
+
+def async_mode():
+    return getattr(settings, 'SERVER_MODE', 'wsgi') == 'asgi'
+
+
+def get_async_redis(alias='default'):
+    """``redis.asyncio`` client for a django-redis cache alias, one per event loop"""
+    loop = asyncio.get_running_loop()
+    clients = _clients.setdefault(alias, WeakKeyDictionary())
+    client = clients.get(loop)
+    if client is None:
+        client = clients[loop] = redis.asyncio.Redis.from_url(settings.CACHES[alias]['LOCATION'])
+    return client
+
+
+async def aget_many(keys, alias='default'):
+    """Async ``caches[alias].get_many(keys)``"""
+    cache = caches[alias]
+    if not async_mode():
+        return await sync_to_async(cache.get_many, thread_sensitive=False)(keys)
+    if not keys:
+        return {}
+    redis_keys = [cache.client.make_key(key) for key in keys]
+    with track('redis'):
+        values = await get_async_redis(alias).mget(redis_keys)
+    return {key: cache.client.decode(value) for key, value in zip(keys, values) if value is not None}
@@ -0,0 +1,387 @@
+"""
+Two-tier cache: a per-process LRU in front of a Redis cache alias.
+
+``TwoTierCache`` is a Django cache backend. Reads are served from an
+in-process LRU (bounded by ``MAX_BYTES`` and by ``LOCAL_TIMEOUT`` seconds per
+entry) and fall back to the ``REMOTE`` alias. Writes go to Redis first, then
+to the local tier, and the key is published on ``CHANNEL`` so every other
+worker and pod drops its local copy. Each process subscribes lazily, after the
+gunicorn fork, in a daemon thread. If the subscription drops, the whole local
+tier is cleared, because invalidations may have been missed.
+``LOCAL_TIMEOUT`` bounds staleness even then.
+
+Lookups are counted per tier (local hit, remote hit, miss) and added to the
+``/metrics`` counters every ``STATS_INTERVAL`` seconds.
+
+    CACHES['tiered'] = {
+        'BACKEND': 'social_media.cache.TwoTierCache',
+        'LOCATION': 'tiered',  # name of the local tier and its metrics label
+        'OPTIONS': {'REMOTE': 'default', 'MAX_BYTES': 16 * 1024 * 1024, 'LOCAL_TIMEOUT': 30},
+    }
+
+Django creates one cache object per thread; the LRU, the subscriber and the
+counters are shared by all of them in a process.
+
+``get_or_compute`` wraps expensive cached values with stampede protection and
+works with any cache alias.
+"""
+
+import logging
+import math
+import os
+import pickle
+import random
+import threading
+import time
+import uuid
+from collections import Counter, OrderedDict
+
+from django.core.cache import cache as default_cache, caches
+from django.core.cache.backends.base import BaseCache, DEFAULT_TIMEOUT
+from django_redis import get_redis_connection
+
+from . import metrics
+
+
+logger = logging.getLogger(__name__)
+
+
+class LocalLRU:
+    """Thread-safe LRU of pickled values, bounded by total size and per-entry TTL"""
+
+    def __init__(self, max_bytes):
+        self.max_bytes = max_bytes
+        self.size = 0
+        self.entries = OrderedDict()  # key -> (expires_at, pickled value)
+        self.lock = threading.Lock()
+
+    def get(self, key):
+        """Return the pickled value, or None if missing or expired"""
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None:
+                return None
+            if entry[0] <= time.monotonic():
+                self._remove(key)
+                return None
+            self.entries.move_to_end(key)
+            return entry[1]
+
+    def set(self, key, data, ttl):
+        if len(data) > self.max_bytes // 4:
+            # One huge value must not flush the whole tier
+            self.delete(key)
+            return
+        with self.lock:
+            self._remove(key)
+            self.entries[key] = (time.monotonic() + ttl, data)
+            self.size += len(data)
+            while self.size > self.max_bytes:
+                _, (_, evicted) = self.entries.popitem(last=False)
+                self.size -= len(evicted)
+
+    def delete(self, key):
+        with self.lock:
+            self._remove(key)
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+            self.size = 0
+
+    def _remove(self, key):
+        entry = self.entries.pop(key, None)
+        if entry is not None:
+            self.size -= len(entry[1])
+
+
+class SharedTier:
+    """Per-process state of one two-tier cache: the LRU, subscriber and counters"""
+
+    def __init__(self, name, remote_alias, channel, max_bytes):
+        self.name = name
+        self.remote_alias = remote_alias
+        self.channel = channel
+        self.local = LocalLRU(max_bytes)
+        self.origin = uuid.uuid4().hex
+        self.stats = Counter()
+        self.stats_flushed_at = time.monotonic()
+        self.listener_pid = None
+        self.lock = threading.Lock()
+
+    def ensure_listener(self):
+        """Start the subscriber thread once per process (after gunicorn forks)"""
+        if self.listener_pid == os.getpid():
+            return
+        with self.lock:
+            if self.listener_pid == os.getpid():
+                return
+            self.listener_pid = os.getpid()
+            # Entries inherited from the parent process were never invalidated
+            self.local.clear()
+            threading.Thread(target=self.listen, name=f'cache-invalidation-{self.name}', daemon=True).start()
+
+    def listen(self):
+        while True:
+            try:
+                pubsub = get_redis_connection(self.remote_alias).pubsub(ignore_subscribe_messages=True)
+                pubsub.subscribe(self.channel)
+                # Anything cached while unsubscribed may have missed invalidations
+                self.local.clear()
+                for message in pubsub.listen():
+                    origin, _, key = message['data'].decode().partition(':')
+                    if origin == self.origin:
+                        continue
+                    if key == '*':
+                        self.local.clear()
+                    else:
+                        self.local.delete(key)
+            except Exception as e:
+                logger.warning("Cache invalidation subscriber failed: %s", e)
+                self.local.clear()
+                time.sleep(1)
+
+    def publish(self, *keys):
+        try:
+            pipe = get_redis_connection(self.remote_alias).pipeline(transaction=False)
+            for key in keys:
+                pipe.publish(self.channel, f'{self.origin}:{key}')
+            pipe.execute()
+        except Exception as e:
+            # Other workers still expire their copy after LOCAL_TIMEOUT
+            logger.warning("Could not publish cache invalidation: %s", e)
+
+    def count(self, result, n, interval):
+        with self.lock:
+            self.stats[result] += n
+            now = time.monotonic()
+            if now - self.stats_flushed_at < interval:
+                return
+            self.stats_flushed_at = now
+            counts, self.stats = self.stats, Counter()
+        try:
+            metrics.record_cache_stats(self.name, counts)
+        except Exception as e:
+            logger.warning("Could not record cache metrics: %s", e)
+
+
+_shared_tiers = {}
+_shared_tiers_lock = threading.Lock()
+
+
+def _shared_tier(name, remote_alias, channel, max_bytes):
+    with _shared_tiers_lock:
+        if name not in _shared_tiers:
+            _shared_tiers[name] = SharedTier(name, remote_alias, channel, max_bytes)
+        return _shared_tiers[name]
+
+
+class TwoTierCache(BaseCache):
+    """In-process LRU in front of a Redis cache alias, kept coherent with pub/sub"""
+
+    def __init__(self, location, params):
+        super().__init__(params)
+        options = params.get('OPTIONS', {})
+        self.remote_alias = options.get('REMOTE', 'default')
+        self.local_timeout = options.get('LOCAL_TIMEOUT', 30)
+        self.stats_interval = options.get('STATS_INTERVAL', 10)
+        self.tier = _shared_tier(
+            location or 'tiered',
+            self.remote_alias,
+            options.get('CHANNEL', 'cache:invalidate'),
+            options.get('MAX_BYTES', 16 * 1024 * 1024),
+        )
+        self.local = self.tier.local
+
+    @property
+    def remote(self):
+        return caches[self.remote_alias]
+
+    def _ensure_listener(self):
+        self.tier.ensure_listener()
+
+    def _publish(self, *keys):
+        self.tier.publish(*keys)
+
+    # Local tier helpers
+
+    def _local_key(self, key, version):
+        return self.remote.make_and_validate_key(key, version=version)
+
+    def _local_ttl(self, timeout):
+        if timeout is DEFAULT_TIMEOUT:
+            timeout = self.remote.default_timeout
+        if timeout is None:
+            return self.local_timeout
+        return min(self.local_timeout, timeout)
+
+    def _store_local(self, local_key, value, timeout=DEFAULT_TIMEOUT):
+        ttl = self._local_ttl(timeout)
+        if ttl > 0:
+            self.local.set(local_key, pickle.dumps(value, pickle.HIGHEST_PROTOCOL), ttl)
+
+    def _count(self, result, n=1):
+        if n:
+            self.tier.count(result, n, self.stats_interval)
+
+    # Django cache API
+
+    def get(self, key, default=None, version=None):
+        self._ensure_listener()
+        local_key = self._local_key(key, version)
+        data = self.local.get(local_key)
+        if data is not None:
+            self._count('local_hit')
+            return pickle.loads(data)
+        sentinel = object()
+        value = self.remote.get(key, sentinel, version=version)
+        if value is sentinel:
+            self._count('miss')
+            return default
+        self._count('remote_hit')
+        self._store_local(local_key, value)
+        return value
+
+    def get_many(self, keys, version=None):
+        self._ensure_listener()
+        found = {}
+        missing = []
+        for key in keys:
+            data = self.local.get(self._local_key(key, version))
+            if data is not None:
+                found[key] = pickle.loads(data)
+            else:
+                missing.append(key)
+        self._count('local_hit', len(found))
+        if missing:
+            remote_found = self.remote.get_many(missing, version=version)
+            self._count('remote_hit', len(remote_found))
+            self._count('miss', len(missing) - len(remote_found))
+            for key, value in remote_found.items():
+                self._store_local(self._local_key(key, version), value)
+            found.update(remote_found)
+        return found
+
+    def set(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        self._ensure_listener()
+        self.remote.set(key, value, timeout, version=version)
+        local_key = self._local_key(key, version)
+        self._store_local(local_key, value, timeout)
+        self._publish(local_key)
+
+    def add(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        self._ensure_listener()
+        added = self.remote.add(key, value, timeout, version=version)
+        if added:
+            local_key = self._local_key(key, version)
+            self._store_local(local_key, value, timeout)
+            self._publish(local_key)
+        return added
+
+    def set_many(self, data, timeout=DEFAULT_TIMEOUT, version=None):
+        self._ensure_listener()
+        failed = self.remote.set_many(data, timeout, version=version)
+        local_keys = []
+        for key, value in data.items():
+            local_key = self._local_key(key, version)
+            self._store_local(local_key, value, timeout)
+            local_keys.append(local_key)
+        if local_keys:
+            self._publish(*local_keys)
+        return failed
+
+    def touch(self, key, timeout=DEFAULT_TIMEOUT, version=None):
+        return self.remote.touch(key, timeout, version=version)
+
+    def delete(self, key, version=None):
+        self._ensure_listener()
+        deleted = self.remote.delete(key, version=version)
+        local_key = self._local_key(key, version)
+        self.local.delete(local_key)
+        self._publish(local_key)
+        return deleted
+
+    def delete_many(self, keys, version=None):
+        self._ensure_listener()
+        keys = list(keys)
+        self.remote.delete_many(keys, version=version)
+        local_keys = [self._local_key(key, version) for key in keys]
+        for local_key in local_keys:
+            self.local.delete(local_key)
+        if local_keys:
+            self._publish(*local_keys)
+
+    def has_key(self, key, version=None):
+        if self.local.get(self._local_key(key, version)) is not None:
+            return True
+        return self.remote.has_key(key, version=version)
+
+    def incr(self, key, delta=1, version=None):
+        value = self.remote.incr(key, delta, version=version)
+        local_key = self._local_key(key, version)
+        self.local.delete(local_key)
+        self._publish(local_key)
+        return value
+
+    def clear(self):
+        self.remote.clear()
+        self.local.clear()
+        self._publish('*')
+
+    def close(self, **kwargs):
+        # Called at the end of every request; the LRU must survive it
+        pass
+
+
+def get_or_compute(key, compute, timeout, cache=None, grace=None, lock_timeout=10, wait=2.0, beta=1.0):
+    """Return the cached value of ``key``, calling ``compute()`` when it is due.
+
+    Protects expensive values from cache stampedes when they expire under load:
+
+    - Values are stored with the time ``compute`` took and are recomputed
+      slightly before ``timeout`` runs out, with a probability that grows as
+      expiry approaches and with the cost of the computation (XFetch), so
+      refreshes are spread out instead of all happening at the same moment.
+    - Only the worker that wins a short lock (``cache.add``) recomputes; the
+      others keep serving the previous value, which stays in the cache for
+      ``grace`` seconds (default: ``timeout``) past its expiry.
+    - With nothing cached at all, the other workers wait up to ``wait``
+      seconds for the winner before computing themselves.
+    """
+    cache = cache or default_cache
+    grace = timeout if grace is None else grace
+    lock_key = f'{key}:lock'
+
+    entry = cache.get(key)
+    if entry is not None:
+        # XFetch: -log(U) is exponentially distributed with mean 1
+        early = entry['delta'] * beta * -math.log(1.0 - random.random())
+        if time.time() + early < entry['expires_at']:
+            return entry['value']
+        locked = cache.add(lock_key, 1, lock_timeout)
+        if not locked:
+            # Somebody else is already recomputing
+            return entry['value']
+    else:
+        locked = cache.add(lock_key, 1, lock_timeout)
+        if not locked:
+            deadline = time.monotonic() + wait
+            while time.monotonic() < deadline:
+                time.sleep(0.05)
+                entry = cache.get(key)
+                if entry is not None:
+                    return entry['value']
+
+    try:
+        started = time.time()
+        value = compute()
+        finished = time.time()
+        cache.set(
+            key,
+            {'value': value, 'expires_at': finished + timeout, 'delta': finished - started},
+            timeout + grace,
+        )
+        return value
+    finally:
+        if locked:
+            cache.delete(lock_key)
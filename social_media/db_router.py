@@ -0,0 +1,74 @@
+"""
+Primary/replica database routing with read-your-writes stickiness.
+
+Writes always go to ``default`` (the primary). Reads go to a random alias in
+``settings.DATABASE_REPLICAS`` unless the current request is pinned to the
+primary. ``ReplicaStickinessMiddleware`` pins a request when it is not a safe
+method, once it has written anything, and for ``REPLICA_STICKY_SECONDS`` after
+the user's last write (tracked in their session), so users always see their
+own posts and comments even while the replicas catch up.
+"""
+
+import random
+import time
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.utils.deprecation import MiddlewareMixin
+
+
+PRIMARY = 'default'
+SESSION_PIN_KEY = '_db_pin_until'
+
+_pinned = ContextVar('db_pinned_to_primary', default=False)
+_wrote = ContextVar('db_wrote', default=False)
+
+
+def pin_to_primary():
+    """Send every following read of the current request/thread to the primary"""
+    _pinned.set(True)
+
+
+class PrimaryReplicaRouter:
+    """Route reads to the replicas and writes to the primary"""
+
+    def db_for_read(self, model, **hints):
+        replicas = getattr(settings, 'DATABASE_REPLICAS', [])
+        if not replicas or _pinned.get():
+            return PRIMARY
+        # Follow related objects to the database their instance came from
+        instance = hints.get('instance')
+        if instance is not None and instance._state.db:
+            return instance._state.db
+        return random.choice(replicas)
+
+    def db_for_write(self, model, **hints):
+        _wrote.set(True)
+        _pinned.set(True)
+        return PRIMARY
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Every alias holds the same data
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        return db == PRIMARY
+
+
+class ReplicaStickinessMiddleware(MiddlewareMixin):
+    """Pin requests to the primary after the user has written something.
+
+    Must come after ``SessionMiddleware``.
+    """
+
+    def process_request(self, request):
+        _wrote.set(False)
+        pin_until = request.session.get(SESSION_PIN_KEY, 0)
+        _pinned.set(request.method not in ('GET', 'HEAD', 'OPTIONS') or pin_until > time.time())
+
+    def process_response(self, request, response):
+        if _wrote.get() and hasattr(request, 'session'):
+            request.session[SESSION_PIN_KEY] = time.time() + getattr(settings, 'REPLICA_STICKY_SECONDS', 15)
+        _wrote.set(False)
+        _pinned.set(False)
+        return response
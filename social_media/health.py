@@ -0,0 +1,118 @@
+"""
+Liveness and readiness endpoints for Kubernetes probes.
+
+``/healthz`` answers as long as the process can serve a request; it touches
+no dependency, so an outage of MySQL or Redis does not get every pod
+restarted. ``/readyz`` probes MySQL, Redis and object storage in parallel,
+each within ``HEALTH_CHECK_TIMEOUT`` seconds, and answers 503 if one of
+them fails so the pod is taken out of the Service until it recovers. The
+result, with each dependency's latency, is kept in the process for
+``HEALTH_CHECK_CACHE_SECONDS``, so frequent probes (several pods, kubelet
+plus load balancer) cost one round of checks per worker per interval. A
+check that hangs is not started again until it returns.
+"""
+
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, wait
+
+from django.conf import settings
+from django.db import connections
+from django.http import JsonResponse
+from django_redis import get_redis_connection
+
+from posts.storage import get_storage
+
+
+def check_database():
+    connection = connections['default']
+    try:
+        with connection.cursor() as cursor:
+            cursor.execute('SELECT 1')
+    finally:
+        # Probe threads are not request threads; nothing closes it otherwise
+        connection.close()
+
+
+def check_redis():
+    get_redis_connection('default').ping()
+
+
+def check_storage():
+    get_storage().check()
+
+
+CHECKS = {
+    'mysql': check_database,
+    'redis': check_redis,
+    'storage': check_storage,
+}
+
+_executor = ThreadPoolExecutor(max_workers=len(CHECKS), thread_name_prefix='health')
+_lock = threading.Lock()
+_running = {}   # check name -> future still running from an earlier round
+_cached = None  # (monotonic time, result)
+
+
+def _run(check):
+    started = time.perf_counter()
+    check()
+    return time.perf_counter() - started
+
+
+def run_checks():
+    """Run every check in parallel; returns ``{name: {'ok', 'latency_ms'[, 'error']}}``"""
+    timeout = getattr(settings, 'HEALTH_CHECK_TIMEOUT', 2.0)
+    for name, check in CHECKS.items():
+        if name not in _running:
+            _running[name] = _executor.submit(_run, check)
+    wait(_running.values(), timeout=timeout)
+
+    results = {}
+    for name, future in list(_running.items()):
+        if not future.done():
+            # Left running; the next round reports it again instead of
+            # piling up another hung connection attempt
+            results[name] = {'ok': False, 'latency_ms': None, 'error': f'Timed out after {timeout}s'}
+            continue
+        del _running[name]
+        try:
+            latency = future.result()
+        except Exception as e:
+            results[name] = {'ok': False, 'latency_ms': None, 'error': f'{type(e).__name__}: {e}'}
+            continue
+        results[name] = {'ok': latency <= timeout, 'latency_ms': round(latency * 1000, 1)}
+        if latency > timeout:
+            # A check left over from an earlier round that timed out
+            results[name]['error'] = f'Answered after {latency:.1f}s'
+    return results
+
+
+def readiness():
+    """``(ready, checks, age in seconds)``, from the cache if it is fresh enough"""
+    global _cached
+    max_age = getattr(settings, 'HEALTH_CHECK_CACHE_SECONDS', 5)
+    # One request runs the checks, concurrent probes wait for its result
+    with _lock:
+        now = time.monotonic()
+        if _cached is None or now - _cached[0] >= max_age:
+            _cached = (now, run_checks())
+        checked_at, checks = _cached
+    ready = all(check['ok'] for check in checks.values())
+    return ready, checks, round(now - checked_at, 1)
+
+
+def healthz_view(request):
+    """Liveness: the process is up and serving requests"""
+    return JsonResponse({'status': 'ok'})
+
+
+def readyz_view(request):
+    """Readiness: MySQL, Redis and object storage answer"""
+    ready, checks, age = readiness()
+    response = JsonResponse(
+        {'status': 'ok' if ready else 'unavailable', 'checks': checks, 'age': age},
+        status=200 if ready else 503,
+    )
+    response['Cache-Control'] = 'no-store'
+    return response
@@ -0,0 +1,179 @@
+"""
+Per-request instrumentation for SQL, Redis, MinIO and template rendering.
+
+Middleware opens a collector with ``begin()`` at the start of a request and
+closes it with ``end()``. While a collector is open, the hooks below record
+the time and number of calls for each kind of backend. When no collector is
+open the hooks only do a context variable lookup.
+"""
+
+import time
+from collections import defaultdict
+from contextlib import contextmanager
+from contextvars import ContextVar
+from functools import wraps
+
+from django.db import connections
+from django.db.backends.signals import connection_created
+from django.template.backends.django import DjangoTemplates
+from django_redis.client import DefaultClient
+
+
+_current_stats = ContextVar('request_stats', default=None)
+
+
+class RequestStats:
+    """Time (seconds) and call counts for one request, keyed by backend kind"""
+
+    def __init__(self):
+        self.started_at = time.perf_counter()
+        self.timings = defaultdict(float)
+        self.counts = defaultdict(int)
+
+    def add(self, kind, duration):
+        self.timings[kind] += duration
+        self.counts[kind] += 1
+
+    @property
+    def elapsed(self):
+        return time.perf_counter() - self.started_at
+
+
+def begin():
+    """Open a collector for the current request (re-uses an open one)"""
+    stats = _current_stats.get()
+    if stats is None:
+        stats = RequestStats()
+        _current_stats.set(stats)
+    return stats
+
+
+def end():
+    """Close the collector for the current request"""
+    _current_stats.set(None)
+
+
+def current():
+    """Return the open collector, or None"""
+    return _current_stats.get()
+
+
+@contextmanager
+def track(kind):
+    """Record the time spent inside the block under ``kind``"""
+    stats = _current_stats.get()
+    if stats is None:
+        yield
+        return
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        stats.add(kind, time.perf_counter() - start)
+
+
+def timed(kind):
+    """Decorator version of ``track``"""
+    def decorator(func):
+        @wraps(func)
+        def wrapper(*args, **kwargs):
+            stats = _current_stats.get()
+            if stats is None:
+                return func(*args, **kwargs)
+            start = time.perf_counter()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                stats.add(kind, time.perf_counter() - start)
+        return wrapper
+    return decorator
+
+
+def sql_execute_wrapper(execute, sql, params, many, context):
+    """``connection.execute_wrapper`` hook that records SQL queries"""
+    stats = _current_stats.get()
+    if stats is None:
+        return execute(sql, params, many, context)
+    start = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        stats.add('sql', time.perf_counter() - start)
+
+
+def _install_sql_wrapper(sender, connection, **kwargs):
+    if sql_execute_wrapper not in connection.execute_wrappers:
+        connection.execute_wrappers.append(sql_execute_wrapper)
+
+
+def install():
+    """Hook SQL recording into every database connection"""
+    connection_created.connect(_install_sql_wrapper, dispatch_uid='instrumentation_sql_wrapper')
+    for connection in connections.all(initialized_only=True):
+        _install_sql_wrapper(None, connection)
+
+
+_in_redis_call = ContextVar('in_redis_call', default=False)
+
+
+def _redis_call(method):
+    # Some client methods call others (``add`` calls ``set``); only the
+    # outermost one is recorded.
+    @wraps(method)
+    def wrapper(*args, **kwargs):
+        stats = _current_stats.get()
+        if stats is None or _in_redis_call.get():
+            return method(*args, **kwargs)
+        token = _in_redis_call.set(True)
+        start = time.perf_counter()
+        try:
+            return method(*args, **kwargs)
+        finally:
+            stats.add('redis', time.perf_counter() - start)
+            _in_redis_call.reset(token)
+    return wrapper
+
+
+class InstrumentedRedisClient(DefaultClient):
+    """django-redis client that records every cache operation as a Redis call.
+
+    Use it as ``OPTIONS['CLIENT_CLASS']`` of a django-redis cache.
+    """
+
+
+_REDIS_CLIENT_METHODS = (
+    'get', 'set', 'add', 'delete', 'delete_many', 'delete_pattern', 'get_many',
+    'set_many', 'incr', 'decr', 'has_key', 'expire', 'touch', 'ttl', 'persist',
+    'keys', 'iter_keys', 'clear',
+)
+
+for _name in _REDIS_CLIENT_METHODS:
+    setattr(InstrumentedRedisClient, _name, _redis_call(getattr(DefaultClient, _name)))
+
+
+class _InstrumentedTemplate:
+    """Wraps a backend template so that rendering is recorded"""
+
+    def __init__(self, template):
+        self.template = template
+
+    @property
+    def origin(self):
+        return self.template.origin
+
+    def render(self, context=None, request=None):
+        with track('template'):
+            return self.template.render(context, request)
+
+
+class InstrumentedDjangoTemplates(DjangoTemplates):
+    """Django template backend that records top-level template rendering.
+
+    Use it as the ``BACKEND`` of a ``TEMPLATES`` entry.
+    """
+
+    def from_string(self, template_code):
+        return _InstrumentedTemplate(super().from_string(template_code))
+
+    def get_template(self, template_name):
+        return _InstrumentedTemplate(super().get_template(template_name))
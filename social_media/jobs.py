@@ -0,0 +1,246 @@
+"""
+Background jobs on the existing Redis.
+
+Side work that does not have to finish before the response is sent (e.g.
+deleting replaced images from object storage) is declared as a job and
+enqueued from the view::
+
+    @job('delete_image')
+    def delete_image(object_name): ...
+
+    delete_image.delay(object_name)
+    delete_image.defer(60, object_name)  # run in a minute
+
+``manage.py run_worker`` runs the jobs. Each queue uses four keys:
+
+- ``jobs:{queue}:ready``: list of job ids waiting to run.
+- ``jobs:{queue}:processing``: sorted set of running job ids, scored by
+  their visibility deadline. A job whose worker died is put back on the
+  ready list once its deadline passes, so delivery is at least once and
+  jobs must be idempotent.
+- ``jobs:{queue}:delayed``: sorted set of failed jobs waiting for their
+  retry, scored by when to run them. Retries back off exponentially.
+- ``jobs:{queue}:dead``: list of jobs that failed ``max_retries`` times,
+  kept with their last error for inspection.
+
+Job payloads (name, JSON arguments, attempts, last error) live in the
+``jobs:data`` hash. Claiming a job, requeueing expired ones and promoting
+due retries happen atomically in one Lua script.
+
+``Queue`` takes any redis-py compatible connection, so tests can pass a
+``fakeredis.FakeRedis()``. With ``JOBS_EAGER`` (or if Redis is unreachable
+at enqueue time) jobs run inline instead.
+"""
+
+import json
+import logging
+import random
+import time
+import uuid
+
+from django.conf import settings
+from django_redis import get_redis_connection
+
+from .instrumentation import track
+
+
+logger = logging.getLogger(__name__)
+
+DATA_KEY = 'jobs:data'
+
+# KEYS: ready, processing, delayed. ARGV: now, visibility timeout, max moved.
+# Returns the claimed job id or nil.
+CLAIM_LUA = """
+local now = tonumber(ARGV[1])
+local limit = tonumber(ARGV[3])
+for _, key in ipairs({KEYS[3], KEYS[2]}) do
+    local due = redis.call('ZRANGEBYSCORE', key, '-inf', now, 'LIMIT', 0, limit)
+    for _, id in ipairs(due) do
+        redis.call('ZREM', key, id)
+        redis.call('RPUSH', KEYS[1], id)
+    end
+end
+local id = redis.call('LPOP', KEYS[1])
+if id then
+    redis.call('ZADD', KEYS[2], now + tonumber(ARGV[2]), id)
+end
+return id
+"""
+
+registry = {}
+
+
+class Job:
+    """A function that can be run by a worker; call ``delay()`` to enqueue it"""
+
+    def __init__(self, func, name, queue='default', max_retries=None, backoff=10):
+        self.func = func
+        self.name = name
+        self.queue = queue
+        self.max_retries = max_retries
+        self.backoff = backoff
+
+    def __call__(self, *args, **kwargs):
+        return self.func(*args, **kwargs)
+
+    def get_max_retries(self):
+        if self.max_retries is not None:
+            return self.max_retries
+        return getattr(settings, 'JOBS_MAX_RETRIES', 5)
+
+    def retry_delay(self, attempts):
+        """Exponential backoff with jitter, capped at one hour"""
+        return min(3600, self.backoff * 2 ** (attempts - 1)) * random.uniform(0.8, 1.2)
+
+    def delay(self, *args, **kwargs):
+        """Enqueue the job; returns its id, or None if it ran inline"""
+        return self.defer(0, *args, **kwargs)
+
+    def defer(self, seconds, *args, **kwargs):
+        """Enqueue the job to run in ``seconds`` (inline and immediately with ``JOBS_EAGER``)"""
+        if getattr(settings, 'JOBS_EAGER', False):
+            self.func(*args, **kwargs)
+            return None
+        try:
+            return Queue(self.queue).enqueue(self.name, args, kwargs, delay=seconds)
+        except Exception as e:
+            # Same as before there was a queue: do the work in the request
+            logger.warning("Could not enqueue job %s, running it inline: %s", self.name, e)
+            self.func(*args, **kwargs)
+            return None
+
+
+def job(name, queue='default', max_retries=None, backoff=10):
+    """Register a function as a background job (see the module docstring)"""
+    def decorator(func):
+        if name in registry:
+            raise ValueError(f"Job {name!r} is already registered")
+        registry[name] = Job(func, name, queue, max_retries, backoff)
+        return registry[name]
+    return decorator
+
+
+class Queue:
+    """One named queue; ``connection`` defaults to the ``default`` Redis cache"""
+
+    def __init__(self, name='default', connection=None, visibility_timeout=None):
+        self.name = name
+        self.conn = connection if connection is not None else get_redis_connection('default')
+        if visibility_timeout is None:
+            visibility_timeout = getattr(settings, 'JOBS_VISIBILITY_TIMEOUT', 300)
+        self.visibility_timeout = visibility_timeout
+        self.ready_key = f'jobs:{name}:ready'
+        self.processing_key = f'jobs:{name}:processing'
+        self.delayed_key = f'jobs:{name}:delayed'
+        self.dead_key = f'jobs:{name}:dead'
+        self._claim = self.conn.register_script(CLAIM_LUA)
+
+    def enqueue(self, name, args=(), kwargs=None, delay=0):
+        job_id = uuid.uuid4().hex
+        payload = {
+            'id': job_id, 'name': name, 'args': list(args), 'kwargs': kwargs or {},
+            'attempts': 0, 'enqueued_at': time.time(),
+        }
+        with track('redis'):
+            pipe = self.conn.pipeline()
+            pipe.hset(DATA_KEY, job_id, json.dumps(payload))
+            if delay > 0:
+                # Promoted to the ready list by claim() once due
+                pipe.zadd(self.delayed_key, {job_id: time.time() + delay})
+            else:
+                pipe.rpush(self.ready_key, job_id)
+            pipe.execute()
+        return job_id
+
+    def claim(self, limit=100):
+        """Take the next ready job, or return None; it stays invisible until acked"""
+        job_id = self._claim(
+            keys=[self.ready_key, self.processing_key, self.delayed_key],
+            args=[time.time(), self.visibility_timeout, limit],
+        )
+        if job_id is None:
+            return None
+        data = self.conn.hget(DATA_KEY, job_id)
+        if data is None:
+            # Acked by a worker whose visibility timeout had already run out
+            self.conn.zrem(self.processing_key, job_id)
+            return None
+        payload = json.loads(data)
+        # Count the attempt before running, so a job that kills its worker
+        # is not redelivered forever
+        payload['attempts'] += 1
+        self.conn.hset(DATA_KEY, job_id, json.dumps(payload))
+        return payload
+
+    def ack(self, payload):
+        pipe = self.conn.pipeline()
+        pipe.zrem(self.processing_key, payload['id'])
+        pipe.hdel(DATA_KEY, payload['id'])
+        pipe.execute()
+
+    def retry(self, payload, error, delay):
+        payload.update(error=error)
+        pipe = self.conn.pipeline()
+        pipe.hset(DATA_KEY, payload['id'], json.dumps(payload))
+        pipe.zrem(self.processing_key, payload['id'])
+        pipe.zadd(self.delayed_key, {payload['id']: time.time() + delay})
+        pipe.execute()
+
+    def bury(self, payload, error):
+        payload.update(error=error, failed_at=time.time())
+        pipe = self.conn.pipeline()
+        pipe.hset(DATA_KEY, payload['id'], json.dumps(payload))
+        pipe.zrem(self.processing_key, payload['id'])
+        pipe.rpush(self.dead_key, payload['id'])
+        pipe.execute()
+
+    def requeue_dead(self):
+        """Give every dead job a fresh set of retries; returns how many"""
+        count = 0
+        while True:
+            job_id = self.conn.lpop(self.dead_key)
+            if job_id is None:
+                return count
+            data = self.conn.hget(DATA_KEY, job_id)
+            if data is not None:
+                payload = json.loads(data)
+                payload['attempts'] = 0
+                pipe = self.conn.pipeline()
+                pipe.hset(DATA_KEY, job_id, json.dumps(payload))
+                pipe.rpush(self.ready_key, job_id)
+                pipe.execute()
+                count += 1
+
+    def stats(self):
+        pipe = self.conn.pipeline(transaction=False)
+        pipe.llen(self.ready_key)
+        pipe.zcard(self.processing_key)
+        pipe.zcard(self.delayed_key)
+        pipe.llen(self.dead_key)
+        return dict(zip(('ready', 'processing', 'delayed', 'dead'), pipe.execute()))
+
+
+def perform(queue, payload):
+    """Run one claimed job and ack, retry or bury it; returns True on success"""
+    task = registry.get(payload['name'])
+    if task is None:
+        queue.bury(payload, f"Unknown job {payload['name']!r}")
+        logger.warning("Unknown job %s", payload['name'])
+        return False
+    if payload['attempts'] > task.get_max_retries() + 1:
+        # Previous attempts never reported back (worker killed or timed out)
+        queue.bury(payload, payload.get('error') or 'Visibility timeout exceeded')
+        return False
+    try:
+        task.func(*payload['args'], **payload['kwargs'])
+    except Exception as e:
+        error = f'{type(e).__name__}: {e}'
+        if payload['attempts'] > task.get_max_retries():
+            logger.warning("Job %s %s failed for good: %s", payload['name'], payload['id'], error)
+            queue.bury(payload, error)
+        else:
+            logger.warning("Job %s %s failed, retrying: %s", payload['name'], payload['id'], error)
+            queue.retry(payload, error, task.retry_delay(payload['attempts']))
+        return False
+    queue.ack(payload)
+    return True
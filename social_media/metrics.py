@@ -0,0 +1,196 @@
+"""
+Prometheus-style request metrics.
+
+``MetricsMiddleware`` records, per view, the request latency histogram and the
+number of SQL queries, Redis calls and MinIO calls. ``TwoTierCache`` adds its
+lookups per tier with ``record_cache_stats``. Counters are kept in a
+Redis hash so that every gunicorn worker (and every pod) adds to the same
+totals; ``metrics_view`` renders them in the Prometheus text format.
+"""
+
+import logging
+from collections import defaultdict
+
+from django.conf import settings
+from django.http import HttpResponse, HttpResponseForbidden
+from django.utils.crypto import constant_time_compare
+from django.utils.deprecation import MiddlewareMixin
+from django_redis import get_redis_connection
+
+from . import instrumentation
+
+
+logger = logging.getLogger(__name__)
+
+METRICS_KEY = 'metrics:http'
+
+# Upper bounds (seconds) of the latency histogram buckets
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+# Backend kinds recorded by ``instrumentation`` and the counter they feed
+BACKEND_COUNTERS = {
+    'sql': ('django_view_sql_queries_total', 'SQL queries run while handling requests, by view.'),
+    'redis': ('django_view_redis_calls_total', 'Redis calls made while handling requests, by view.'),
+    'minio': ('django_view_minio_calls_total', 'MinIO calls made while handling requests, by view.'),
+}
+
+# Results counted by social_media.cache.TwoTierCache
+CACHE_RESULTS = ('local_hit', 'remote_hit', 'miss')
+
+SEPARATOR = '|'
+
+
+def get_metrics_connection():
+    """Get the raw Redis connection used as the shared metrics store"""
+    return get_redis_connection(getattr(settings, 'METRICS_CACHE_ALIAS', 'default'))
+
+
+def _bucket_for(duration):
+    for bound in LATENCY_BUCKETS:
+        if duration <= bound:
+            return str(bound)
+    return '+Inf'
+
+
+def record_request(view, method, status, duration, stats):
+    """Add one finished request to the shared counters"""
+    prefix = SEPARATOR.join((view, method))
+    pipe = get_metrics_connection().pipeline(transaction=False)
+    pipe.hincrby(METRICS_KEY, SEPARATOR.join(('requests', prefix, str(status))), 1)
+    # Only the matching bucket is stored; buckets are made cumulative on render
+    pipe.hincrby(METRICS_KEY, SEPARATOR.join(('bucket', view, _bucket_for(duration))), 1)
+    pipe.hincrbyfloat(METRICS_KEY, SEPARATOR.join(('duration_sum', view)), duration)
+    for kind in BACKEND_COUNTERS:
+        count = stats.counts.get(kind)
+        if count:
+            pipe.hincrby(METRICS_KEY, SEPARATOR.join((kind, view)), count)
+    pipe.execute()
+
+
+def record_cache_stats(cache_name, counts):
+    """Add a batch of two-tier cache lookups (result -> count) to the shared counters"""
+    pipe = get_metrics_connection().pipeline(transaction=False)
+    for result, count in counts.items():
+        pipe.hincrby(METRICS_KEY, SEPARATOR.join(('cache', cache_name, result)), count)
+    pipe.execute()
+
+
+class MetricsMiddleware(MiddlewareMixin):
+    """Collect per-view latency and backend call counts.
+
+    Place it first in ``MIDDLEWARE`` so that the latency covers the whole
+    middleware stack.
+    """
+
+    def __init__(self, get_response):
+        super().__init__(get_response)
+        instrumentation.install()
+
+    def process_request(self, request):
+        request._metrics_stats = instrumentation.begin()
+
+    def process_response(self, request, response):
+        stats = getattr(request, '_metrics_stats', None)
+        if stats is None:
+            return response
+        instrumentation.end()
+
+        match = getattr(request, 'resolver_match', None)
+        view = match.view_name if match else '<unresolved>'
+        if view == 'metrics':
+            return response
+
+        try:
+            record_request(view, request.method, response.status_code, stats.elapsed, stats)
+        except Exception as e:
+            # Never fail a request because the metrics store is unavailable
+            logger.warning("Could not record request metrics: %s", e)
+        return response
+
+
+def _label_value(value):
+    return value.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _labels(**labels):
+    return '{' + ','.join(f'{name}="{_label_value(value)}"' for name, value in labels.items()) + '}'
+
+
+def render_metrics(raw):
+    """Render the raw counter hash in the Prometheus text exposition format"""
+    requests_total = []
+    buckets = defaultdict(dict)
+    sums = {}
+    backend = defaultdict(list)
+    cache_lookups = []
+
+    for field, value in raw.items():
+        field = field.decode() if isinstance(field, bytes) else field
+        value = value.decode() if isinstance(value, bytes) else value
+        parts = field.split(SEPARATOR)
+        kind = parts[0]
+        if kind == 'requests' and len(parts) == 4:
+            requests_total.append((parts[1], parts[2], parts[3], value))
+        elif kind == 'bucket' and len(parts) == 3:
+            buckets[parts[1]][parts[2]] = int(value)
+        elif kind == 'duration_sum' and len(parts) == 2:
+            sums[parts[1]] = float(value)
+        elif kind in BACKEND_COUNTERS and len(parts) == 2:
+            backend[kind].append((parts[1], value))
+        elif kind == 'cache' and len(parts) == 3 and parts[2] in CACHE_RESULTS:
+            cache_lookups.append((parts[1], parts[2], value))
+
+    lines = [
+        '# HELP django_http_requests_total Requests handled, by view, method and status.',
+        '# TYPE django_http_requests_total counter',
+    ]
+    for view, method, status, value in sorted(requests_total):
+        lines.append(f'django_http_requests_total{_labels(view=view, method=method, status=status)} {value}')
+
+    lines += [
+        '# HELP django_http_request_duration_seconds Request latency, by view.',
+        '# TYPE django_http_request_duration_seconds histogram',
+    ]
+    for view in sorted(buckets):
+        cumulative = 0
+        for bound in [str(b) for b in LATENCY_BUCKETS] + ['+Inf']:
+            cumulative += buckets[view].get(bound, 0)
+            lines.append(
+                f'django_http_request_duration_seconds_bucket{_labels(view=view, le=bound)} {cumulative}'
+            )
+        lines.append(f'django_http_request_duration_seconds_sum{_labels(view=view)} {sums.get(view, 0.0)}')
+        lines.append(f'django_http_request_duration_seconds_count{_labels(view=view)} {cumulative}')
+
+    for kind, (name, help_text) in BACKEND_COUNTERS.items():
+        lines += [
+            f'# HELP {name} {help_text}',
+            f'# TYPE {name} counter',
+        ]
+        for view, value in sorted(backend[kind]):
+            lines.append(f'{name}{_labels(view=view)} {value}')
+
+    lines += [
+        '# HELP django_cache_lookups_total Two-tier cache lookups, by cache and result (local_hit, remote_hit, miss).',
+        '# TYPE django_cache_lookups_total counter',
+    ]
+    for cache_name, result, value in sorted(cache_lookups):
+        lines.append(f'django_cache_lookups_total{_labels(cache=cache_name, result=result)} {value}')
+
+    return '\n'.join(lines) + '\n'
+
+
+def metrics_view(request):
+    """Expose the shared counters for Prometheus to scrape"""
+    token = getattr(settings, 'METRICS_TOKEN', '')
+    if token:
+        supplied = request.headers.get('Authorization', '').removeprefix('Bearer ').strip()
+        if not constant_time_compare(supplied, token):
+            return HttpResponseForbidden("Forbidden")
+
+    try:
+        raw = get_metrics_connection().hgetall(METRICS_KEY)
+    except Exception as e:
+        logger.warning("Could not read request metrics: %s", e)
+        return HttpResponse("Metrics store unavailable\n", status=503, content_type='text/plain')
+
+    return HttpResponse(render_metrics(raw), content_type='text/plain; version=0.0.4; charset=utf-8')
@@ -0,0 +1,179 @@
+"""
+On-demand sampling profiler for production requests.
+
+``ProfilingMiddleware`` profiles a random ``PROFILING_SAMPLE_RATE`` fraction of
+requests, plus any request from a staff user that asks for it with
+``?_profile=1`` or an ``X-Profile: 1`` header. While a request is profiled, a
+background thread samples the stack of the request thread every
+``PROFILING_INTERVAL`` seconds. The folded stacks are stored in Redis and can
+be listed and dumped with ``manage.py profiles``.
+
+Async views (e.g. ``like_post_view``) are not profiled: they run on an event
+loop, not on the request thread, so the samples would show an idle thread or
+another request's work. Sync views run on the thread that ran the middleware,
+under ASGI too (both are called thread-sensitively).
+"""
+
+import json
+import logging
+import random
+import sys
+import threading
+import time
+import uuid
+from collections import Counter
+
+from asgiref.sync import iscoroutinefunction
+from django.conf import settings
+from django.utils import timezone
+from django.utils.deprecation import MiddlewareMixin
+from django_redis import get_redis_connection
+
+
+logger = logging.getLogger(__name__)
+
+PROFILE_KEY = 'profiles:{}'
+PROFILE_INDEX_KEY = 'profiles:index'
+MAX_STACK_DEPTH = 128
+
+# Only one request per process is profiled at a time to bound the overhead
+_profiling_lock = threading.Lock()
+
+
+def _frame_name(frame):
+    code = frame.f_code
+    module = frame.f_globals.get('__name__', '?')
+    return f"{module}.{getattr(code, 'co_qualname', code.co_name)}"
+
+
+class StackSampler:
+    """Samples the stack of one thread and counts folded stacks"""
+
+    def __init__(self, thread_id, interval):
+        self.thread_id = thread_id
+        self.interval = interval
+        self.stacks = Counter()
+        self.samples = 0
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name='stack-sampler', daemon=True)
+
+    def start(self):
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            if frame is None:
+                continue
+            names = []
+            while frame is not None and len(names) < MAX_STACK_DEPTH:
+                names.append(_frame_name(frame))
+                frame = frame.f_back
+            # Folded stacks are written root first
+            self.stacks[';'.join(reversed(names))] += 1
+            self.samples += 1
+
+
+def get_profiles_connection():
+    """Get the raw Redis connection used to store profiles"""
+    return get_redis_connection(getattr(settings, 'PROFILING_CACHE_ALIAS', 'default'))
+
+
+def store_profile(profile):
+    """Save a profile and add it to the index of recent profiles"""
+    keep = getattr(settings, 'PROFILING_MAX_STORED', 100)
+    ttl = getattr(settings, 'PROFILING_TTL', 7 * 24 * 3600)
+    pipe = get_profiles_connection().pipeline(transaction=False)
+    pipe.setex(PROFILE_KEY.format(profile['id']), ttl, json.dumps(profile))
+    pipe.lpush(PROFILE_INDEX_KEY, profile['id'])
+    pipe.ltrim(PROFILE_INDEX_KEY, 0, keep - 1)
+    pipe.execute()
+
+
+def list_profiles(limit=50):
+    """Return the most recent stored profiles (newest first)"""
+    conn = get_profiles_connection()
+    ids = [i.decode() for i in conn.lrange(PROFILE_INDEX_KEY, 0, limit - 1)]
+    if not ids:
+        return []
+    raw = conn.mget([PROFILE_KEY.format(i) for i in ids])
+    return [json.loads(item) for item in raw if item]
+
+
+def get_profile(profile_id):
+    """Return one stored profile, or None if it expired"""
+    raw = get_profiles_connection().get(PROFILE_KEY.format(profile_id))
+    return json.loads(raw) if raw else None
+
+
+def folded_stacks(profile):
+    """Render a profile as folded stacks (flamegraph.pl / speedscope input)"""
+    lines = [f'{stack} {count}' for stack, count in sorted(profile['stacks'].items())]
+    return '\n'.join(lines) + '\n'
+
+
+class ProfilingMiddleware(MiddlewareMixin):
+    """Profile sampled or staff-flagged requests.
+
+    Must come after ``AuthenticationMiddleware`` so that staff users can be
+    recognised.
+    """
+
+    def should_profile(self, request):
+        flagged = request.GET.get('_profile') == '1' or request.headers.get('X-Profile') == '1'
+        if flagged:
+            user = getattr(request, 'user', None)
+            if user and user.is_staff:
+                return True
+        rate = getattr(settings, 'PROFILING_SAMPLE_RATE', 0.0)
+        return rate > 0 and random.random() < rate
+
+    def process_request(self, request):
+        if not self.should_profile(request):
+            return
+        if not _profiling_lock.acquire(blocking=False):
+            return
+        sampler = StackSampler(threading.get_ident(), getattr(settings, 'PROFILING_INTERVAL', 0.005))
+        request._profiler = sampler
+        request._profiler_started_at = time.perf_counter()
+        sampler.start()
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        sampler = getattr(request, '_profiler', None)
+        if sampler is not None and iscoroutinefunction(view_func):
+            # The sampled thread does not run the view (see the module docstring)
+            sampler.stop()
+            del request._profiler
+            _profiling_lock.release()
+
+    def process_response(self, request, response):
+        sampler = getattr(request, '_profiler', None)
+        if sampler is None:
+            return response
+        try:
+            sampler.stop()
+            duration = time.perf_counter() - request._profiler_started_at
+            match = getattr(request, 'resolver_match', None)
+            profile = {
+                'id': uuid.uuid4().hex[:12],
+                'created_at': timezone.now().isoformat(),
+                'method': request.method,
+                'path': request.get_full_path(),
+                'view': match.view_name if match else None,
+                'status': response.status_code,
+                'duration': duration,
+                'interval': sampler.interval,
+                'samples': sampler.samples,
+                'stacks': dict(sampler.stacks),
+            }
+            store_profile(profile)
+            response['X-Profile-Id'] = profile['id']
+        except Exception as e:
+            logger.warning("Could not store request profile: %s", e)
+        finally:
+            _profiling_lock.release()
+        return response
@@ -0,0 +1,180 @@
+"""
+Token-bucket rate limiting backed by Redis.
+
+Views opt in with the ``ratelimit`` decorator::
+
+    @ratelimit('login', rate='10/m', key='ip')
+    def login_view(request): ...
+
+``RateLimitMiddleware`` checks every policy of the matched view in
+``process_view``, before ``CsrfViewMiddleware`` reads the request body and
+before the view runs, so a client over its limit costs one Redis script call
+and gets a plain 429. Each bucket is refilled and debited atomically by a Lua
+script, so concurrent workers cannot overspend it.
+
+Rates can be overridden per scope with ``settings.RATELIMITS``, e.g.
+``{'login': '20/m'}``. If Redis is unavailable requests are let through.
+"""
+
+import asyncio
+import logging
+import math
+import time
+from functools import wraps
+
+from django.conf import settings
+from django.http import HttpResponse, JsonResponse
+from django.utils.deprecation import MiddlewareMixin
+from django_redis import get_redis_connection
+
+from .instrumentation import track
+
+
+logger = logging.getLogger(__name__)
+
+# KEYS[1]: bucket key. ARGV: refill rate (tokens/s), capacity, now (s), cost.
+# Returns {allowed (0/1), seconds until enough tokens (string)}.
+TOKEN_BUCKET_LUA = """
+local rate = tonumber(ARGV[1])
+local capacity = tonumber(ARGV[2])
+local now = tonumber(ARGV[3])
+local cost = tonumber(ARGV[4])
+local bucket = redis.call('HMGET', KEYS[1], 'tokens', 'ts')
+local tokens = tonumber(bucket[1]) or capacity
+local ts = tonumber(bucket[2]) or now
+tokens = math.min(capacity, tokens + math.max(0, now - ts) * rate)
+local allowed = 0
+local retry_after = 0
+if tokens >= cost then
+    tokens = tokens - cost
+    allowed = 1
+else
+    retry_after = (cost - tokens) / rate
+end
+redis.call('HSET', KEYS[1], 'tokens', tokens, 'ts', now)
+redis.call('PEXPIRE', KEYS[1], math.ceil(capacity / rate * 1000))
+return {allowed, tostring(retry_after)}
+"""
+
+PERIODS = {'s': 1, 'm': 60, 'h': 3600, 'd': 86400}
+
+_script = None
+
+
+def parse_rate(rate):
+    """``'10/m'`` -> (10, 60)"""
+    count, _, period = rate.partition('/')
+    return int(count), PERIODS[period]
+
+
+def client_ip(request):
+    """Client address; nginx passes it in X-Real-IP"""
+    header = getattr(settings, 'RATELIMIT_IP_HEADER', 'HTTP_X_REAL_IP')
+    return request.META.get(header) or request.META.get('REMOTE_ADDR', '')
+
+
+def user_or_ip(request):
+    user = getattr(request, 'user', None)
+    if user is not None and user.is_authenticated:
+        return f'user:{user.pk}'
+    return f'ip:{client_ip(request)}'
+
+
+KEY_FUNCTIONS = {
+    'ip': lambda request: f'ip:{client_ip(request)}',
+    'user': user_or_ip,
+}
+
+
+class Policy:
+    """One bucket per (scope, key) refilled at ``rate``, holding ``burst`` tokens"""
+
+    def __init__(self, scope, rate, key='user', burst=None, methods=('POST',)):
+        self.scope = scope
+        self.rate = rate
+        self.key = KEY_FUNCTIONS[key] if isinstance(key, str) else key
+        self.burst = burst
+        self.methods = methods
+
+    def bucket(self):
+        """(tokens per second, capacity), honouring ``settings.RATELIMITS``"""
+        count, period = parse_rate(getattr(settings, 'RATELIMITS', {}).get(self.scope, self.rate))
+        return count / period, self.burst or count
+
+    def applies_to(self, request):
+        return self.methods is None or request.method in self.methods
+
+
+def ratelimit(scope, rate, key='user', burst=None, methods=('POST',)):
+    """Attach a rate-limit policy to a view (decorators can be stacked).
+
+    ``key`` is ``'ip'``, ``'user'`` (the user id, or the IP for anonymous
+    requests) or a function of the request returning a string.
+    """
+    policy = Policy(scope, rate, key, burst, methods)
+
+    def decorator(view_func):
+        if asyncio.iscoroutinefunction(view_func):
+            @wraps(view_func)
+            async def wrapper(*args, **kwargs):
+                return await view_func(*args, **kwargs)
+        else:
+            @wraps(view_func)
+            def wrapper(*args, **kwargs):
+                return view_func(*args, **kwargs)
+        # The outermost decorator is checked first
+        wrapper._ratelimit_policies = (policy,) + getattr(view_func, '_ratelimit_policies', ())
+        return wrapper
+    return decorator
+
+
+def consume(key, rate, capacity, cost=1):
+    """Take ``cost`` tokens from a bucket; returns (allowed, retry_after seconds)"""
+    global _script
+    if _script is None:
+        # register_script uses EVALSHA and reloads the script when needed
+        _script = get_redis_connection('default').register_script(TOKEN_BUCKET_LUA)
+    with track('redis'):
+        allowed, retry_after = _script(keys=[key], args=[rate, capacity, time.time(), cost])
+    return bool(allowed), float(retry_after)
+
+
+def too_many_requests(request, retry_after):
+    retry_after = max(1, math.ceil(retry_after))
+    if 'application/json' in request.headers.get('Accept', '') or \
+            request.headers.get('X-Requested-With') == 'XMLHttpRequest':
+        response = JsonResponse({'error': 'Too many requests'}, status=429)
+    else:
+        response = HttpResponse('Too many requests. Please try again later.', status=429, content_type='text/plain')
+    response['Retry-After'] = str(retry_after)
+    return response
+
+
+class RateLimitMiddleware(MiddlewareMixin):
+    """Enforce ``ratelimit`` policies before the view runs.
+
+    Must be listed before ``CsrfViewMiddleware`` so rejected uploads are never
+    parsed. ``request.user`` is already available because every
+    ``process_request`` runs before the first ``process_view``.
+    """
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        policies = getattr(view_func, '_ratelimit_policies', None)
+        if not policies or not getattr(settings, 'RATELIMIT_ENABLED', True):
+            return None
+        for policy in policies:
+            if not policy.applies_to(request):
+                continue
+            identity = policy.key(request)
+            if not identity:
+                continue
+            rate, capacity = policy.bucket()
+            try:
+                allowed, retry_after = consume(f'ratelimit:{policy.scope}:{identity}', rate, capacity)
+            except Exception as e:
+                # Fail open: an outage of Redis must not lock everybody out
+                logger.warning("Rate limit check failed: %s", e)
+                return None
+            if not allowed:
+                return too_many_requests(request, retry_after)
+        return None
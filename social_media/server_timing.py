@@ -0,0 +1,71 @@
+"""
+Opt-in ``Server-Timing`` header.
+
+For staff users, or requests that carry the ``X-Debug-Token`` header matching
+``SERVER_TIMING_TOKEN``, the response gets a ``Server-Timing`` header with the
+time and number of calls spent in SQL, Redis, MinIO and template rendering, so
+the breakdown shows up in the browser devtools. Other requests only pay for
+the checks in ``is_enabled``.
+"""
+
+from django.conf import settings
+from django.utils.crypto import constant_time_compare
+from django.utils.deprecation import MiddlewareMixin
+
+from . import instrumentation
+
+
+# Backend kinds recorded by ``instrumentation`` and their devtools label
+TIMING_LABELS = (
+    ('sql', 'SQL'),
+    ('redis', 'Redis'),
+    ('minio', 'MinIO'),
+    ('template', 'Templates'),
+)
+
+
+def format_server_timing(stats):
+    """Build the Server-Timing header value for a finished request"""
+    entries = []
+    for kind, label in TIMING_LABELS:
+        count = stats.counts.get(kind, 0)
+        duration = stats.timings.get(kind, 0.0) * 1000
+        entries.append(f'{kind};dur={duration:.1f};desc="{label} ({count})"')
+    entries.append(f'total;dur={stats.elapsed * 1000:.1f};desc="Total"')
+    return ', '.join(entries)
+
+
+class ServerTimingMiddleware(MiddlewareMixin):
+    """Add a Server-Timing breakdown to opted-in responses.
+
+    Must come after ``AuthenticationMiddleware`` so that staff users can be
+    recognised.
+    """
+
+    def __init__(self, get_response):
+        super().__init__(get_response)
+        instrumentation.install()
+
+    def is_enabled(self, request):
+        token = getattr(settings, 'SERVER_TIMING_TOKEN', '')
+        supplied = request.headers.get('X-Debug-Token')
+        if token and supplied and constant_time_compare(supplied, token):
+            return True
+        user = getattr(request, 'user', None)
+        return bool(user and user.is_staff)
+
+    def process_request(self, request):
+        if not self.is_enabled(request):
+            return
+        # Re-use the collector opened by MetricsMiddleware when it is installed
+        request._server_timing_owner = instrumentation.current() is None
+        request._server_timing_stats = instrumentation.begin()
+
+    def process_response(self, request, response):
+        stats = getattr(request, '_server_timing_stats', None)
+        if stats is None:
+            return response
+        if request._server_timing_owner:
+            instrumentation.end()
+        response['Server-Timing'] = format_server_timing(stats)
+        return response
@@ -3,7 +3,7 @@ Django settings for social_media project.
 """
 
 from pathlib import Path
-from decouple import config
+from decouple import config, Csv
 import os
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
@@ -13,7 +13,8 @@ BASE_DIR = Path(__file__).resolve().parent.parent
 SECRET_KEY = 'django-insecure-your-secret-key-here-change-in-production'
 
 # SECURITY WARNING: don't run with debug turned on in production!
-DEBUG = True
+# Also needed off for {% static %} to link the hashed, long-cached file names
+DEBUG = config('DEBUG', default=True, cast=bool)
 
 # Allow any host - domain management handled by DNS/hosts file
 ALLOWED_HOSTS = ['*']
@@ -29,15 +30,22 @@ INSTALLED_APPS = [
     'corsheaders',
     'users',
     'posts',
+    'notifications',
 ]
 
 MIDDLEWARE = [
+    'social_media.metrics.MetricsMiddleware',
     'corsheaders.middleware.CorsMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
+    'users.middleware.SessionPreloadMiddleware',
+    'social_media.db_router.ReplicaStickinessMiddleware',
     'django.middleware.common.CommonMiddleware',
+    'social_media.ratelimit.RateLimitMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
+    'social_media.server_timing.ServerTimingMiddleware',
+    'social_media.profiling.ProfilingMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
@@ -46,7 +54,7 @@ ROOT_URLCONF = 'social_media.urls'
 
 TEMPLATES = [
     {
-        'BACKEND': 'django.template.backends.django.DjangoTemplates',
+        'BACKEND': 'social_media.instrumentation.InstrumentedDjangoTemplates',
         'DIRS': [BASE_DIR / 'templates'],
         'APP_DIRS': True,
         'OPTIONS': {
@@ -55,6 +63,8 @@ TEMPLATES = [
                 'django.template.context_processors.request',
                 'django.contrib.auth.context_processors.auth',
                 'django.contrib.messages.context_processors.messages',
+                'notifications.context_processors.unread_notifications',
+                'posts.context_processors.live_counts',
             ],
         },
     },
@@ -74,18 +84,51 @@ DATABASES = {
         'OPTIONS': {
             'charset': 'utf8mb4',
         },
+        # Keep connections open between requests, checking them before re-use
+        'CONN_MAX_AGE': config('DATABASE_CONN_MAX_AGE', default=60, cast=int),
+        'CONN_HEALTH_CHECKS': True,
     }
 }
 
+# Read replicas: reads are spread over these hosts, writes go to the primary.
+# Each replica uses the primary's name, credentials and port.
+DATABASE_REPLICA_HOSTS = config('DATABASE_REPLICA_HOSTS', default='', cast=Csv())
+DATABASE_REPLICAS = []
+for index, host in enumerate(DATABASE_REPLICA_HOSTS):
+    alias = f'replica_{index}'
+    DATABASES[alias] = {
+        **DATABASES['default'],
+        'HOST': host,
+        'TEST': {'MIRROR': 'default'},
+    }
+    DATABASE_REPLICAS.append(alias)
+
+DATABASE_ROUTERS = ['social_media.db_router.PrimaryReplicaRouter']
+
+# After a write, the user's reads stay on the primary for this many seconds
+# so they see their own changes despite replication lag.
+REPLICA_STICKY_SECONDS = config('REPLICA_STICKY_SECONDS', default=15, cast=int)
+
 # Redis Configuration for Session Storage
 CACHES = {
     'default': {
         'BACKEND': 'django_redis.cache.RedisCache',
         'LOCATION': f"redis://{config('REDIS_HOST', default='localhost')}:{config('REDIS_PORT', default='6379')}/1",
         'OPTIONS': {
-            'CLIENT_CLASS': 'django_redis.client.DefaultClient',
+            'CLIENT_CLASS': 'social_media.instrumentation.InstrumentedRedisClient',
         }
-    }
+    },
+    # Per-worker LRU in front of 'default' for small, hot objects
+    # (see social_media/cache.py)
+    'tiered': {
+        'BACKEND': 'social_media.cache.TwoTierCache',
+        'LOCATION': 'tiered',
+        'OPTIONS': {
+            'REMOTE': 'default',
+            'MAX_BYTES': config('TIERED_CACHE_MAX_BYTES', default=16 * 1024 * 1024, cast=int),
+            'LOCAL_TIMEOUT': config('TIERED_CACHE_LOCAL_TIMEOUT', default=30, cast=int),
+        }
+    },
 }
 
 # Session Configuration
@@ -99,6 +142,50 @@ SESSION_COOKIE_SECURE = False  # Set to True only if using HTTPS
 SESSION_COOKIE_HTTPONLY = True
 SESSION_COOKIE_SAMESITE = 'Lax'
 
+# Rate limiting (see social_media/ratelimit.py). Behind nginx the client IP
+# is taken from X-Real-IP; set RATELIMIT_IP_HEADER=REMOTE_ADDR without a proxy.
+RATELIMIT_ENABLED = config('RATELIMIT_ENABLED', default=True, cast=bool)
+RATELIMIT_IP_HEADER = config('RATELIMIT_IP_HEADER', default='HTTP_X_REAL_IP')
+# Per-scope overrides, e.g. RATELIMITS=login=20/m,upload=5/m
+RATELIMITS = dict(item.split('=', 1) for item in config('RATELIMITS', default='', cast=Csv()))
+
+# Load the logged-in user through the Redis user cache
+AUTHENTICATION_BACKENDS = ['users.backends.CachedModelBackend']
+
+# Buffer last_login in Redis and write it with one bulk UPDATE per interval
+LAST_LOGIN_BUFFER = config('LAST_LOGIN_BUFFER', default=True, cast=bool)
+LAST_LOGIN_FLUSH_INTERVAL = config('LAST_LOGIN_FLUSH_INTERVAL', default=60, cast=int)
+
+# Cache alias for User and UserProfile rows
+USER_CACHE_ALIAS = 'tiered'
+# Seconds User and UserProfile rows stay cached in Redis
+USER_CACHE_TIMEOUT = config('USER_CACHE_TIMEOUT', default=300, cast=int)
+
+# 'wsgi' (sync Gunicorn workers) or 'asgi' (uvicorn workers). Under ASGI the
+# async views (image proxy, like, check_session) use async Redis and MinIO
+# clients; the Docker image picks the Gunicorn worker class from it too.
+SERVER_MODE = config('SERVER_MODE', default='wsgi')
+
+# Background jobs (see social_media/jobs.py), run by `manage.py run_worker`.
+# JOBS_EAGER runs them inside the request instead, e.g. without a worker.
+JOBS_EAGER = config('JOBS_EAGER', default=False, cast=bool)
+JOBS_MAX_RETRIES = config('JOBS_MAX_RETRIES', default=5, cast=int)
+# Seconds a worker may spend on a job before it is handed to another worker
+JOBS_VISIBILITY_TIMEOUT = config('JOBS_VISIBILITY_TIMEOUT', default=300, cast=int)
+
+# Likes and comments are coalesced in Redis and written to the notifications
+# table at most once per interval (see notifications/buffer.py)
+NOTIFICATIONS_FLUSH_INTERVAL = config('NOTIFICATIONS_FLUSH_INTERVAL', default=10, cast=int)
+
+# Hours after which a like or comment counts half as much for Trending
+# (see posts/trending.py)
+TRENDING_HALF_LIFE_HOURS = config('TRENDING_HALF_LIFE_HOURS', default=6, cast=float)
+
+# /readyz probes MySQL, Redis and object storage (see social_media/health.py):
+# seconds each check may take, and seconds a result is reused
+HEALTH_CHECK_TIMEOUT = config('HEALTH_CHECK_TIMEOUT', default=2.0, cast=float)
+HEALTH_CHECK_CACHE_SECONDS = config('HEALTH_CHECK_CACHE_SECONDS', default=5, cast=float)
+
 # Password validation
 AUTH_PASSWORD_VALIDATORS = [
     {
@@ -127,6 +214,12 @@ STATIC_ROOT = BASE_DIR / 'staticfiles'
 STATICFILES_DIRS = [
     BASE_DIR / 'static',
 ]
+# collectstatic writes content-hashed names plus .gz/.br copies for nginx
+# (see social_media/staticfiles.py); {% static %} reads the manifest
+STORAGES = {
+    'default': {'BACKEND': 'django.core.files.storage.FileSystemStorage'},
+    'staticfiles': {'BACKEND': 'social_media.staticfiles.CompressedManifestStaticFilesStorage'},
+}
 
 # Media files (not used - all images stored in MinIO)
 # MEDIA_URL = '/media/'
@@ -142,6 +235,11 @@ MINIO_SECRET_KEY = config('MINIO_SECRET_KEY', default='minioadmin123')
 MINIO_BUCKET_NAME = config('MINIO_BUCKET_NAME', default='social-media-app')
 MINIO_USE_HTTPS = config('MINIO_USE_HTTPS', default=False, cast=bool)
 
+# Object storage backend for post images and profile pictures:
+# posts.storage.MinioStorage or posts.storage.LocalFileSystemStorage
+OBJECT_STORAGE_BACKEND = config('OBJECT_STORAGE_BACKEND', default='posts.storage.MinioStorage')
+LOCAL_STORAGE_ROOT = config('LOCAL_STORAGE_ROOT', default=str(BASE_DIR / 'media'))
+
 # CORS settings - allow any origin
 CORS_ALLOW_ALL_ORIGINS = True
 CORS_ALLOW_CREDENTIALS = True
@@ -182,6 +280,25 @@ CSRF_COOKIE_HTTPONLY = False
 CSRF_USE_SESSIONS = True
 CSRF_COOKIE_SAMESITE = 'Lax'
 
+# Metrics (/metrics, Prometheus text format)
+# Counters live in the Redis cache so all gunicorn workers share them.
+METRICS_CACHE_ALIAS = 'default'
+# When set, scrapers must send "Authorization: Bearer <token>"
+METRICS_TOKEN = config('METRICS_TOKEN', default='')
+
+# Server-Timing header: sent to staff users, or to requests whose
+# X-Debug-Token header matches this token
+SERVER_TIMING_TOKEN = config('SERVER_TIMING_TOKEN', default='')
+
+# Sampling profiler: profiles this fraction of requests (0 disables sampling).
+# Staff users can profile a single request with ?_profile=1 or "X-Profile: 1".
+# Stored profiles are listed/dumped with "manage.py profiles".
+PROFILING_SAMPLE_RATE = config('PROFILING_SAMPLE_RATE', default=0.0, cast=float)
+PROFILING_INTERVAL = 0.005  # seconds between stack samples
+PROFILING_CACHE_ALIAS = 'default'
+PROFILING_MAX_STORED = 100
+PROFILING_TTL = 7 * 24 * 3600  # 1 week
+
 # Login/Logout URLs
 LOGIN_URL = '/login/'
 LOGIN_REDIRECT_URL = '/dashboard/'
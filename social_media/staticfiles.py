@@ -0,0 +1,73 @@
+"""
+Static files storage with hashed names and precompressed copies.
+
+``collectstatic`` writes ``css/style.css`` as ``css/style.<md5>.css`` (plus
+the manifest that ``{% static %}`` reads), so nginx can serve it with a
+year-long immutable cache: a changed file gets a new name. Text assets also
+get ``.gz`` and ``.br`` siblings, compressed once at maximum level, which
+nginx sends as is (``gzip_static``) instead of compressing every response.
+Brotli copies need the ``brotli`` package and are skipped without it.
+"""
+
+import gzip
+import logging
+
+from django.contrib.staticfiles.storage import ManifestStaticFilesStorage
+from django.core.files.base import ContentFile
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+
+logger = logging.getLogger(__name__)
+
+COMPRESSIBLE_EXTENSIONS = ('.css', '.js', '.mjs', '.map', '.svg', '.json', '.txt', '.xml', '.html', '.ico', '.ttf', '.eot')
+# Not worth a second file (and nginx's gzip_min_length skips them anyway)
+MIN_SIZE = 256
+
+
+class CompressedManifestStaticFilesStorage(ManifestStaticFilesStorage):
+    """``ManifestStaticFilesStorage`` that also writes ``.gz`` and ``.br`` files"""
+
+    def post_process(self, paths, dry_run=False, **options):
+        hashed_names = {}
+        for name, hashed_name, processed in super().post_process(paths, dry_run, **options):
+            if hashed_name and not isinstance(processed, Exception):
+                hashed_names[name] = hashed_name
+            yield name, hashed_name, processed
+        if dry_run:
+            return
+
+        # After the last pass, when the url() references inside CSS are final.
+        # The unhashed copies are compressed too, for anything linking them.
+        names = set(hashed_names) | set(hashed_names.values())
+        compressed = sum(self.compress(name) for name in sorted(names) if name.endswith(COMPRESSIBLE_EXTENSIONS))
+        logger.info("Precompressed %d static files", compressed)
+
+    def compress(self, name):
+        """Write ``name.gz`` (and ``name.br``) next to ``name``; returns how many were written"""
+        with self.open(name) as f:
+            content = f.read()
+        written = 0
+        for suffix, compress in (('.gz', self.gzip_compress), ('.br', self.brotli_compress if brotli else None)):
+            # An unhashed file keeps its name, so drop the copy of its old content
+            if self.exists(name + suffix):
+                self.delete(name + suffix)
+            if compress is None or len(content) < MIN_SIZE:
+                continue
+            data = compress(content)
+            if len(data) < len(content):
+                self._save(name + suffix, ContentFile(data))
+                written += 1
+        return written
+
+    @staticmethod
+    def gzip_compress(content):
+        # mtime=0 keeps the .gz identical between collectstatic runs
+        return gzip.compress(content, compresslevel=9, mtime=0)
+
+    @staticmethod
+    def brotli_compress(content):
+        return brotli.compress(content, quality=11)
@@ -5,11 +5,17 @@ from django.contrib import admin
 from django.urls import path, include
 from django.conf import settings
 from django.conf.urls.static import static
+from .health import healthz_view, readyz_view
+from .metrics import metrics_view
 
 urlpatterns = [
     path('admin/', admin.site.urls),
+    path('metrics', metrics_view, name='metrics'),
+    path('healthz', healthz_view, name='healthz'),
+    path('readyz', readyz_view, name='readyz'),
     path('', include('users.urls')),
     path('posts/', include('posts.urls')),
+    path('notifications/', include('notifications.urls')),
 ]
 
 # Only serve static files during development (media files are served from MinIO)
@@ -0,0 +1,22 @@
+// Like functionality
+function likePost(postId) {
+    fetch(`/posts/${postId}/like/`, {
+        method: 'POST',
+        headers: {
+            'X-CSRFToken': document.querySelector('[name=csrfmiddlewaretoken]').value,
+        },
+    })
+    .then(response => response.json())
+    .then(data => {
+        const likeBtn = document.querySelector(`#like-btn-${postId}`);
+        const likeCount = document.querySelector(`#like-count-${postId}`);
+
+        if (data.liked) {
+            likeBtn.classList.add('liked');
+        } else {
+            likeBtn.classList.remove('liked');
+        }
+
+        likeCount.textContent = data.like_count;
+    });
+}
@@ -0,0 +1,24 @@
+// Live like and comment counts for the posts on this page. Only included
+// under ASGI; under WSGI the stream is switched off.
+(function () {
+    const postIds = Array.from(document.querySelectorAll('[id^="like-count-"]'))
+        .map(el => el.id.replace('like-count-', ''));
+    if (!postIds.length || !window.EventSource) {
+        return;
+    }
+    const source = new EventSource(`/posts/live/?ids=${postIds.join(',')}`);
+    source.onmessage = function (event) {
+        const counts = JSON.parse(event.data);
+        if (counts.likes !== undefined) {
+            const likeCount = document.querySelector(`#like-count-${counts.id}`);
+            if (likeCount) {
+                likeCount.textContent = counts.likes;
+            }
+        }
+        if (counts.comments !== undefined) {
+            document.querySelectorAll(`.comment-count-${counts.id}`).forEach(el => {
+                el.textContent = counts.comments;
+            });
+        }
+    };
+})();
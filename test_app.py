@@ -359,6 +359,25 @@ def test_image_proxy():
         print(f"❌ Image proxy test failed: {e}")
         return False
 
+def test_api_conditional_get():
+    """Test API ETags, including the weak form nginx sends after gzipping"""
+    print("🔍 Testing API conditional GET...")
+    
+    from django.test import RequestFactory
+    from posts.api import json_response
+    
+    factory = RequestFactory()
+    etag = json_response(factory.get('/posts/api/feed/'), {'posts': []})['ETag']
+    
+    for sent in (etag, f'W/{etag}', f'"other", W/{etag}', '*'):
+        response = json_response(factory.get('/posts/api/feed/', HTTP_IF_NONE_MATCH=sent), {'posts': []})
+        assert response.status_code == 304, f"Expected 304 for If-None-Match {sent}, got {response.status_code}"
+    print("✅ Strong and weak ETags answered with 304")
+    
+    response = json_response(factory.get('/posts/api/feed/', HTTP_IF_NONE_MATCH='W/"other"'), {'posts': []})
+    assert response.status_code == 200, f"Expected 200 for a stale ETag, got {response.status_code}"
+    print("✅ Stale ETag answered with 200")
+
 def test_application_accessibility():
     """Test application accessibility from different hosts"""
     print("🔍 Testing application accessibility...")
@@ -397,6 +416,17 @@ def test_application_accessibility():
     except Exception as e:
         print(f"❌ Health endpoint test failed: {e}")
 
+    # Test readiness endpoint (MySQL, Redis and MinIO as seen by the app)
+    try:
+        response = requests.get(f'http://{server_host}/readyz', timeout=5)
+        for name, check in response.json()['checks'].items():
+            if check['ok']:
+                print(f"✅ {name}: {check['latency_ms']} ms")
+            else:
+                print(f"❌ {name}: {check['error']}")
+    except Exception as e:
+        print(f"❌ Readiness endpoint test failed: {e}")
+
 def run_all_tests():
     """Run all tests"""
     print("🚀 Starting comprehensive test suite...")
@@ -411,6 +441,7 @@ def run_all_tests():
         test_django_forms,
         test_high_availability_features,
         test_image_proxy,
+        test_api_conditional_get,
         test_application_accessibility
     ]
     
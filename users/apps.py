@@ -1,6 +1,17 @@
 from django.apps import AppConfig
+from django.conf import settings
 
 
 class UsersConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
-    name = 'users' 
\ No newline at end of file
+    name = 'users'
+
+    def ready(self):
+        if settings.LAST_LOGIN_BUFFER:
+            # Replace the per-login UPDATE of auth_user with a Redis buffer
+            from django.contrib.auth.models import update_last_login
+            from django.contrib.auth.signals import user_logged_in
+            from .last_login import buffer_last_login
+
+            user_logged_in.disconnect(update_last_login, dispatch_uid='update_last_login')
+            user_logged_in.connect(buffer_last_login, dispatch_uid='buffer_last_login')
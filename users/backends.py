@@ -0,0 +1,16 @@
+from django.contrib.auth.backends import ModelBackend
+
+from .cache import get_users
+
+
+class CachedModelBackend(ModelBackend):
+    """``ModelBackend`` that loads the logged-in user through the Redis cache.
+
+    ``AuthenticationMiddleware`` calls ``get_user`` on every authenticated
+    request; with this backend that is a Redis GET instead of a MySQL query.
+    Password checks in ``authenticate`` still go to the database.
+    """
+
+    def get_user(self, user_id):
+        user = get_users([user_id]).get(user_id)
+        return user if self.user_can_authenticate(user) else None
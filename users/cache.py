@@ -0,0 +1,131 @@
+"""
+Redis keys for logged-in users.
+
+- ``user_session_{id}``: the session marker written at login. Views treat a
+  missing marker as an expired session. It lives as long as the Django
+  session (``SESSION_COOKIE_AGE``) and both are extended while the user is
+  active (see ``needs_refresh``).
+- ``user:{id}`` and ``profile:{id}``: pickled ``User`` and ``UserProfile``
+  rows keyed by user id, read through with ``get_many`` so a whole page of
+  authors costs one Redis round trip. They are invalidated from the
+  ``post_save``/``post_delete`` handlers in ``users.models``. They go through
+  ``USER_CACHE_ALIAS`` (the two-tier cache), so hot authors are usually served
+  from the worker's memory. The keys live in Redis under the same names.
+"""
+
+import time
+
+from django.conf import settings
+from django.core.cache import cache, caches
+
+
+def session_marker_key(user_id):
+    return f"user_session_{user_id}"
+
+
+def user_cache_key(user_id):
+    return f"user:{user_id}"
+
+
+def profile_cache_key(user_id):
+    return f"profile:{user_id}"
+
+
+def set_session_marker(user):
+    """Write the marker for a logged-in user with a fresh TTL"""
+    session_data = {
+        'user_id': user.id,
+        'username': user.username,
+        'is_authenticated': True,
+        'refreshed_at': time.time(),
+    }
+    cache.set(session_marker_key(user.id), session_data, timeout=settings.SESSION_COOKIE_AGE)
+    return session_data
+
+
+def needs_refresh(session_data):
+    """True once less than half of the session lifetime is left.
+
+    Refreshing only then keeps sliding expiration from turning every
+    request into a session write.
+    """
+    refreshed_at = session_data.get('refreshed_at', 0)
+    return time.time() - refreshed_at >= settings.SESSION_COOKIE_AGE / 2
+
+
+def get_session_marker(request):
+    """The ``user_session_*`` marker of the current user.
+
+    Returns the value ``SessionPreloadMiddleware`` already fetched, and only
+    falls back to a Redis GET when the request was not preloaded.
+    """
+    if hasattr(request, '_session_marker'):
+        return request._session_marker
+    return cache.get(session_marker_key(request.user.id))
+
+
+def user_cache():
+    return caches[settings.USER_CACHE_ALIAS]
+
+
+def _read_through(user_ids, key_func, load):
+    """Return ``{user_id: obj}`` from one MGET, loading the misses with one query"""
+    keys = {key_func(user_id): user_id for user_id in user_ids}
+    objects = {keys[key]: obj for key, obj in user_cache().get_many(list(keys)).items()}
+    missing = [user_id for user_id in keys.values() if user_id not in objects]
+    if missing:
+        loaded = load(missing)
+        if loaded:
+            user_cache().set_many(
+                {key_func(user_id): obj for user_id, obj in loaded.items()},
+                timeout=settings.USER_CACHE_TIMEOUT
+            )
+        objects.update(loaded)
+    return objects
+
+
+def get_users(user_ids):
+    """``User`` objects by id, read through the cache"""
+    from django.contrib.auth.models import User
+    return _read_through(user_ids, user_cache_key, User.objects.in_bulk)
+
+
+def get_profiles(user_ids):
+    """``UserProfile`` objects by user id, read through the cache"""
+    from .models import UserProfile
+    return _read_through(user_ids, profile_cache_key, lambda missing: {
+        profile.user_id: profile for profile in UserProfile.objects.filter(user_id__in=missing)
+    })
+
+
+def attach_profile(user, profile):
+    """Make ``user.userprofile`` return ``profile`` without a query"""
+    from django.contrib.auth.models import User
+    from .models import UserProfile
+    User.userprofile.related.set_cached_value(user, profile)
+    UserProfile.user.field.set_cached_value(profile, user)
+
+
+def attach_profiles(users):
+    """Fill ``userprofile`` for a page of users (e.g. post authors) in one batch"""
+    from django.contrib.auth.models import User
+    users = [user for user in users if not User.userprofile.is_cached(user)]
+    if not users:
+        return
+    profiles = get_profiles({user.pk for user in users})
+    for user in users:
+        profile = profiles.get(user.pk)
+        if profile is not None:
+            attach_profile(user, profile)
+        else:
+            # Users created before UserProfile existed: make
+            # ``user.userprofile`` raise DoesNotExist without a query
+            User.userprofile.related.set_cached_value(user, None)
+
+
+def invalidate_user(user_id):
+    user_cache().delete(user_cache_key(user_id))
+
+
+def invalidate_profile(user_id):
+    user_cache().delete(profile_cache_key(user_id))
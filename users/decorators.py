@@ -0,0 +1,26 @@
+from functools import wraps
+
+from asgiref.sync import sync_to_async
+from django.contrib.auth.views import redirect_to_login
+
+
+async def aget_user(request):
+    """``request.user`` from an async view.
+
+    ``SessionPreloadMiddleware`` has usually attached the user already; only
+    otherwise is it loaded, in a thread, because that may query the database.
+    """
+    if not hasattr(request, '_cached_user'):
+        await sync_to_async(lambda: request.user.is_authenticated)()
+    return request._cached_user
+
+
+def async_login_required(view_func):
+    """``login_required`` for async views (Django 4.2's only wraps sync views)"""
+    @wraps(view_func)
+    async def wrapper(request, *args, **kwargs):
+        user = await aget_user(request)
+        if not user.is_authenticated:
+            return redirect_to_login(request.get_full_path())
+        return await view_func(request, *args, **kwargs)
+    return wrapper
@@ -0,0 +1,10 @@
+from social_media.jobs import job
+
+from .last_login import flush_last_logins
+
+
+@job('flush_last_login')
+def flush_last_login():
+    """Write the last_login timestamps buffered in Redis to the database"""
+    # Safe to redeliver: a batch interrupted half-way is picked up by the next run
+    flush_last_logins()
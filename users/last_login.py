@@ -0,0 +1,81 @@
+"""
+Buffered ``last_login`` updates.
+
+Django's ``update_last_login`` receiver runs ``UPDATE auth_user`` on every
+login, which also invalidates the cached user. With ``LAST_LOGIN_BUFFER``
+enabled, logins only record the timestamp in a Redis hash. The first login
+of an interval schedules the ``flush_last_login`` job
+``LAST_LOGIN_FLUSH_INTERVAL`` seconds later, which writes everything pending
+with one ``bulk_update``; a timestamp waits at most about one interval
+(``manage.py flush_last_login`` writes the buffer immediately). If Redis is
+unreachable, the login writes ``last_login`` directly as Django would.
+"""
+
+import logging
+from datetime import datetime, timezone as dt_timezone
+
+from django.conf import settings
+from django.contrib.auth.models import User, update_last_login
+from django.utils import timezone
+from django_redis import get_redis_connection
+
+from social_media.instrumentation import track
+
+
+logger = logging.getLogger(__name__)
+
+PENDING_KEY = 'last_login:pending'
+FLUSHING_KEY = 'last_login:flushing'
+FLUSH_LOCK_KEY = 'last_login:flush_lock'
+
+
+def buffer_last_login(sender, user, **kwargs):
+    """``user_logged_in`` receiver replacing ``django.contrib.auth.models.update_last_login``"""
+    user.last_login = timezone.now()
+    try:
+        conn = get_redis_connection('default')
+        with track('redis'):
+            pipe = conn.pipeline(transaction=False)
+            pipe.hset(PENDING_KEY, user.pk, user.last_login.timestamp())
+            pipe.set(FLUSH_LOCK_KEY, 1, nx=True, ex=settings.LAST_LOGIN_FLUSH_INTERVAL)
+            _, flush_due = pipe.execute()
+    except Exception as e:
+        # A Redis outage must not fail the login
+        logger.warning("Could not buffer last_login, writing it directly: %s", e)
+        update_last_login(sender, user)
+        return
+    if flush_due:
+        from .jobs import flush_last_login
+        # Trailing flush, so the logins of the whole interval land in one batch
+        flush_last_login.defer(settings.LAST_LOGIN_FLUSH_INTERVAL)
+
+
+def flush_last_logins(batch_size=1000):
+    """Write the buffered timestamps to the database; returns the number of users"""
+    conn = get_redis_connection('default')
+    flushed = 0
+    with track('redis'):
+        # A previous flush that died half-way left its batch behind
+        leftover = conn.exists(FLUSHING_KEY)
+    if leftover:
+        flushed += _flush_batch(conn, batch_size)
+    with track('redis'):
+        # Logins arriving from now on start a new hash
+        renamed = conn.renamenx(PENDING_KEY, FLUSHING_KEY) if conn.exists(PENDING_KEY) else False
+    if renamed:
+        flushed += _flush_batch(conn, batch_size)
+    return flushed
+
+
+def _flush_batch(conn, batch_size):
+    with track('redis'):
+        pending = conn.hgetall(FLUSHING_KEY)
+    users = [
+        User(pk=int(user_id), last_login=datetime.fromtimestamp(float(timestamp), tz=dt_timezone.utc))
+        for user_id, timestamp in pending.items()
+    ]
+    # bulk_update skips post_save, so the cached users stay valid
+    User.objects.bulk_update(users, ['last_login'], batch_size=batch_size)
+    with track('redis'):
+        conn.delete(FLUSHING_KEY)
+    return len(users)
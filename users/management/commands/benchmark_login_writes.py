@@ -0,0 +1,85 @@
+import json
+from collections import Counter
+
+from django.contrib.auth.models import User, update_last_login
+from django.contrib.auth.signals import user_logged_in
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.test import Client, override_settings
+from django.test.utils import CaptureQueriesContext
+
+from users.last_login import buffer_last_login, flush_last_logins
+
+
+USERNAME = 'benchmark_login_writes'
+PASSWORD = 'benchmark-login-123'
+
+
+class Command(BaseCommand):
+    help = (
+        'Log in repeatedly through the login view and report the SQL statements '
+        'per login, with last_login written directly and buffered in Redis.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--logins', type=int, default=20, help='Logins per mode')
+        parser.add_argument('--output', help='Write the results as JSON to this file')
+
+    def handle(self, *args, **options):
+        user = User.objects.filter(username=USERNAME).first()
+        if user is None:
+            user = User.objects.create_user(USERNAME, password=PASSWORD)
+
+        results = {}
+        try:
+            for mode, receiver in (('direct', update_last_login), ('buffered', buffer_last_login)):
+                results[mode] = self.measure(receiver, options['logins'])
+        finally:
+            self.restore_receivers()
+            flush_last_logins()
+            user.delete()
+
+        self.stdout.write(f"{'mode':10s} {'SELECT':>7s} {'INSERT':>7s} {'UPDATE':>7s} {'DELETE':>7s} {'writes':>7s}")
+        for mode, counts in results.items():
+            self.stdout.write(
+                f"{mode:10s} {counts['SELECT']:7.2f} {counts['INSERT']:7.2f} {counts['UPDATE']:7.2f} "
+                f"{counts['DELETE']:7.2f} {counts['writes']:7.2f}"
+            )
+        self.stdout.write('(statements per login, averaged; buffered includes the periodic bulk flush)')
+        if options['output']:
+            with open(options['output'], 'w') as f:
+                json.dump(results, f, indent=2)
+            self.stdout.write(self.style.SUCCESS(f"Results written to {options['output']}"))
+
+    def use_receiver(self, receiver):
+        user_logged_in.disconnect(dispatch_uid='update_last_login')
+        user_logged_in.disconnect(dispatch_uid='buffer_last_login')
+        dispatch_uid = 'buffer_last_login' if receiver is buffer_last_login else 'update_last_login'
+        user_logged_in.connect(receiver, dispatch_uid=dispatch_uid)
+
+    def restore_receivers(self):
+        from django.conf import settings
+        self.use_receiver(buffer_last_login if settings.LAST_LOGIN_BUFFER else update_last_login)
+
+    def measure(self, receiver, logins):
+        self.use_receiver(receiver)
+        counts = Counter()
+        # Rate limits would stop the benchmark after a few logins
+        with override_settings(RATELIMIT_ENABLED=False, LAST_LOGIN_FLUSH_INTERVAL=3600):
+            for _ in range(logins):
+                client = Client()
+                with CaptureQueriesContext(connection) as queries:
+                    response = client.post('/login/', {'username': USERNAME, 'password': PASSWORD})
+                if response.status_code != 302:
+                    self.stderr.write(f'Login failed with status {response.status_code}')
+                for query in queries.captured_queries:
+                    counts[query['sql'].split(None, 1)[0].upper()] += 1
+            # Buffered logins are written later in one bulk UPDATE; count it too
+            with CaptureQueriesContext(connection) as queries:
+                flush_last_logins()
+            for query in queries.captured_queries:
+                counts[query['sql'].split(None, 1)[0].upper()] += 1
+
+        per_login = {kind: counts[kind] / logins for kind in ('SELECT', 'INSERT', 'UPDATE', 'DELETE')}
+        per_login['writes'] = per_login['INSERT'] + per_login['UPDATE'] + per_login['DELETE']
+        return per_login
@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from users.last_login import flush_last_logins
+
+
+class Command(BaseCommand):
+    help = 'Write the last_login timestamps buffered in Redis to the database now'
+
+    def handle(self, *args, **options):
+        count = flush_last_logins()
+        self.stdout.write(self.style.SUCCESS(f'Flushed last_login for {count} users'))
@@ -0,0 +1,146 @@
+"""
+Load everything an authenticated request needs from Redis in one round trip.
+
+Without it a page makes up to three Redis calls and one MySQL query before
+the view runs:
+
+1. ``SessionMiddleware`` loads the session from the cache.
+2. ``AuthenticationMiddleware`` loads the ``User`` from MySQL.
+3. The view reads the ``user_session_{id}`` marker.
+
+``SessionPreloadMiddleware`` fetches the session, the marker, the cached
+``User`` and its ``UserProfile`` with a single ``get_many`` (one MGET). It needs the user id before
+the session is read, so it sets a small ``uid`` hint cookie after login. The
+hint is never trusted: it is only used if it matches the user id stored in the
+session, and the user is only attached after the same session hash check
+``django.contrib.auth.get_user`` performs. On any mismatch or miss the request
+takes the normal path.
+
+While a user is active the session and the marker slide forward: once less
+than half of ``SESSION_COOKIE_AGE`` is left, the response re-saves the session
+and rewrites the marker, so users are not logged out mid-session. This costs
+at most one extra write per half lifetime, not one per request.
+
+Must come right after ``SessionMiddleware`` and before anything that reads the
+session.
+"""
+
+from django.conf import settings
+from django.contrib.auth import (
+    BACKEND_SESSION_KEY, HASH_SESSION_KEY, SESSION_KEY, get_user_model, load_backend,
+)
+from django.contrib.sessions.backends.cache import SessionStore as CacheSessionStore
+from django.core.cache import DEFAULT_CACHE_ALIAS, cache
+from django.utils.crypto import constant_time_compare
+from django.utils.deprecation import MiddlewareMixin
+
+from .cache import (
+    attach_profile, needs_refresh, profile_cache_key, session_marker_key, set_session_marker, user_cache_key,
+)
+
+
+USER_HINT_COOKIE = 'uid'
+
+
+class SessionPreloadMiddleware(MiddlewareMixin):
+    """Prime the session, the session marker and ``request.user`` with one MGET"""
+
+    def process_request(self, request):
+        session = getattr(request, 'session', None)
+        hint = request.COOKIES.get(USER_HINT_COOKIE, '')
+        if (
+            not isinstance(session, CacheSessionStore)
+            or settings.SESSION_CACHE_ALIAS != DEFAULT_CACHE_ALIAS
+            or not session.session_key
+            or not hint.isdigit()
+        ):
+            return
+
+        session_cache_key = session.cache_key
+        marker_key = session_marker_key(hint)
+        user_key = user_cache_key(hint)
+        profile_key = profile_cache_key(hint)
+        values = cache.get_many([session_cache_key, marker_key, user_key, profile_key])
+
+        session_data = values.get(session_cache_key)
+        if session_data is None:
+            # Expired or unknown session; SessionStore starts a new one as usual
+            return
+        session._session_cache = session_data
+        if str(session_data.get(SESSION_KEY)) != hint:
+            return
+
+        request._session_marker = values.get(marker_key)
+        user = self.verified_user(session_data, values.get(user_key))
+        if user is not None:
+            # AuthenticationMiddleware uses this instead of querying MySQL
+            request._cached_user = user
+            if values.get(profile_key) is not None:
+                attach_profile(user, values[profile_key])
+
+    def verified_user(self, session_data, user):
+        """Return the session's user if the session is still valid for it"""
+        backend_path = session_data.get(BACKEND_SESSION_KEY)
+        if backend_path not in settings.AUTHENTICATION_BACKENDS:
+            return None
+        if user is None:
+            # CachedModelBackend reads through and fills the user cache
+            user_id = get_user_model()._meta.pk.to_python(session_data[SESSION_KEY])
+            user = load_backend(backend_path).get_user(user_id)
+            if user is None:
+                return None
+        if not user.is_active:
+            return None
+
+        # Same check as django.contrib.auth.get_user: a password change
+        # invalidates every other session of the user
+        session_hash = session_data.get(HASH_SESSION_KEY)
+        if not session_hash or not constant_time_compare(session_hash, user.get_session_auth_hash()):
+            return None
+        return user
+
+    def process_response(self, request, response):
+        session = getattr(request, 'session', None)
+        # Only look at sessions this request loaded anyway
+        if session is None or not hasattr(session, '_session_cache'):
+            return response
+
+        user_id = session.get(SESSION_KEY)
+        self.refresh_session(request, session, user_id)
+
+        hint = request.COOKIES.get(USER_HINT_COOKIE)
+        if user_id is not None and str(user_id) != hint:
+            response.set_cookie(
+                USER_HINT_COOKIE,
+                str(user_id),
+                max_age=None if settings.SESSION_EXPIRE_AT_BROWSER_CLOSE else settings.SESSION_COOKIE_AGE,
+                path=settings.SESSION_COOKIE_PATH,
+                domain=settings.SESSION_COOKIE_DOMAIN,
+                secure=settings.SESSION_COOKIE_SECURE,
+                httponly=True,
+                samesite=settings.SESSION_COOKIE_SAMESITE,
+            )
+        elif user_id is None and hint:
+            response.delete_cookie(
+                USER_HINT_COOKIE,
+                path=settings.SESSION_COOKIE_PATH,
+                domain=settings.SESSION_COOKIE_DOMAIN,
+                samesite=settings.SESSION_COOKIE_SAMESITE,
+            )
+        return response
+
+    def refresh_session(self, request, session, user_id):
+        """Slide the session and marker expiry forward for active users"""
+        marker = getattr(request, '_session_marker', None)
+        user = getattr(request, '_cached_user', None)
+        if (
+            not marker
+            or user is None
+            or str(user_id) != str(marker.get('user_id'))
+            or not needs_refresh(marker)
+        ):
+            return
+        set_session_marker(user)
+        # SessionMiddleware runs after us and re-saves the session with a
+        # fresh expiry
+        session.modified = True
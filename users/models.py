@@ -1,7 +1,8 @@
-from django.db import models
+from django.db import models, transaction
 from django.contrib.auth.models import User
-from django.db.models.signals import post_save
+from django.db.models.signals import post_save, post_delete
 from django.dispatch import receiver
+from .cache import invalidate_user, invalidate_profile
 
 
 class UserProfile(models.Model):
@@ -16,28 +17,44 @@ class UserProfile(models.Model):
         return f"{self.user.username}'s profile"
     
     def delete(self, *args, **kwargs):
-        # Delete profile picture from MinIO if it exists
-        if self.profile_picture:
-            try:
-                from posts.utils import delete_from_minio
-                # Convert ImageFieldFile to string for MinIO deletion
-                image_name = str(self.profile_picture)
-                delete_from_minio(image_name)
-            except:
-                pass  # Ignore deletion errors
-        super().delete(*args, **kwargs)
+        image_name = str(self.profile_picture) if self.profile_picture else None
+        result = super().delete(*args, **kwargs)
+        # Remove the profile picture from object storage in the background,
+        # once the delete has committed
+        if image_name:
+            from posts.jobs import delete_image
+            transaction.on_commit(lambda: delete_image.delay(image_name))
+        return result
 
 
 @receiver(post_save, sender=User)
-def create_user_profile(sender, instance, created, **kwargs):
+def create_user_profile(sender, instance, created, update_fields=None, raw=False, **kwargs):
+    """Give every user a profile.
+
+    Profiles are saved by their own forms, so saving a User does not write
+    the profile again. Partial saves such as the ``last_login`` update on
+    login are skipped entirely.
+    """
+    if raw:
+        return
     if created:
         UserProfile.objects.create(user=instance)
+    elif update_fields is None and not User.userprofile.is_cached(instance):
+        # Create UserProfile if it doesn't exist (for users created before UserProfile model)
+        UserProfile.objects.get_or_create(user=instance)
 
 
 @receiver(post_save, sender=User)
-def save_user_profile(sender, instance, **kwargs):
-    try:
-        instance.userprofile.save()
-    except UserProfile.DoesNotExist:
-        # Create UserProfile if it doesn't exist (for users created before UserProfile model)
-        UserProfile.objects.create(user=instance) 
\ No newline at end of file
+@receiver(post_delete, sender=User)
+def invalidate_cached_user(sender, instance, update_fields=None, **kwargs):
+    # Password, is_active and name changes must be visible on the next request;
+    # a stale last_login in the cache does not matter
+    if update_fields is not None and set(update_fields) == {'last_login'}:
+        return
+    invalidate_user(instance.pk)
+
+
+@receiver(post_save, sender=UserProfile)
+@receiver(post_delete, sender=UserProfile)
+def invalidate_cached_profile(sender, instance, **kwargs):
+    invalidate_profile(instance.user_id)
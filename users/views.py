@@ -4,16 +4,26 @@ from django.contrib.auth.decorators import login_required
 from django.contrib import messages
 from django.contrib.auth.models import User
 from django.http import JsonResponse
-from django.views.decorators.csrf import csrf_exempt
 from django.core.cache import cache
+from django.db import transaction
 import json
 from .forms import (
     CustomUserCreationForm, CustomAuthenticationForm, 
     UserProfileForm, UserUpdateForm, CustomPasswordChangeForm
 )
 from .models import UserProfile
+from social_media.aio import aget_many
+from social_media.ratelimit import ratelimit
+from .cache import get_session_marker, session_marker_key, set_session_marker
 
 
+def login_username(request):
+    """Rate-limit key for login attempts against one account"""
+    username = request.POST.get('username', '').strip().lower()
+    return f'username:{username}' if username else None
+
+
+@ratelimit('signup', rate='10/h', key='ip')
 def signup_view(request):
     if request.method == 'POST':
         form = CustomUserCreationForm(request.POST)
@@ -30,6 +40,10 @@ def signup_view(request):
     return render(request, 'users/signup.html', {'form': form})
 
 
+
+# PBKDF2 makes every attempt expensive; limit per client and per account
+@ratelimit('login', rate='10/m', key='ip')
+@ratelimit('login-account', rate='5/m', key=login_username)
 def login_view(request):
     if request.user.is_authenticated:
         return redirect('dashboard')
@@ -43,13 +57,7 @@ def login_view(request):
             if user is not None:
                 login(request, user)
                 # Store session info in Redis for high availability
-                session_key = f"user_session_{user.id}"
-                session_data = {
-                    'user_id': user.id,
-                    'username': user.username,
-                    'is_authenticated': True
-                }
-                cache.set(session_key, session_data, timeout=3600)  # 1 hour
+                set_session_marker(user)
                 
                 messages.success(request, f'Welcome back, {user.username}!')
                 return redirect('dashboard')
@@ -66,7 +74,7 @@ def login_view(request):
 @login_required
 def logout_view(request):
     # Clear session from Redis
-    session_key = f"user_session_{request.user.id}"
+    session_key = session_marker_key(request.user.id)
     cache.delete(session_key)
     
     logout(request)
@@ -76,72 +84,59 @@ def logout_view(request):
 
 @login_required
 def dashboard_view(request):
-    # Verify session from Redis
-    session_key = f"user_session_{request.user.id}"
-    session_data = cache.get(session_key)
+    # Verify session from Redis (preloaded by SessionPreloadMiddleware)
+    session_data = get_session_marker(request)
     
     if not session_data or not session_data.get('is_authenticated'):
         logout(request)
         messages.error(request, 'Session expired. Please login again.')
         return redirect('login')
     
-    # Get recent posts for the dashboard
-    from posts.models import Post
-    recent_posts = Post.objects.select_related('author').prefetch_related('likes', 'comments').order_by('-created_at')[:6]
+    # Recent community posts are the same for everybody: cache them briefly
+    from posts.cache import recent_posts
     
     return render(request, 'users/dashboard.html', {
         'user': request.user,
-        'recent_posts': recent_posts
+        'recent_posts': recent_posts()
     })
 
 
 @login_required
+@ratelimit('upload', rate='10/m')
 def profile_view(request):
     if request.method == 'POST':
         user_form = UserUpdateForm(request.POST, instance=request.user)
         profile_form = UserProfileForm(request.POST, request.FILES, instance=request.user.userprofile)
         
         if user_form.is_valid() and profile_form.is_valid():
-            user_form.save()
-            
-            # Handle profile picture upload to MinIO
+            old_image_name = None
+            # Handle profile picture upload to object storage
             if 'profile_picture' in request.FILES:
-                profile_picture = request.FILES['profile_picture']
+                from posts.jobs import delete_image
+                from posts.utils import store_upload
                 
-                # Delete old profile picture if it exists
-                if request.user.userprofile.profile_picture:
-                    try:
-                        from posts.utils import delete_from_minio
-                        # Convert ImageFieldFile to string for MinIO deletion
-                        old_image_name = str(request.user.userprofile.profile_picture)
-                        delete_from_minio(old_image_name)
-                    except:
-                        pass  # Ignore deletion errors
+                # The form has already put the new file on the instance
+                old_image_name = UserProfile.objects.filter(
+                    user=request.user
+                ).values_list('profile_picture', flat=True).first()
                 
-                # Save temporarily to handle MinIO upload
-                import tempfile
-                import os
-                temp_fd, temp_path = tempfile.mkstemp(suffix=os.path.splitext(profile_picture.name)[1])
-                with os.fdopen(temp_fd, 'wb') as destination:
-                    for chunk in profile_picture.chunks():
-                        destination.write(chunk)
-                
-                # Upload to MinIO
-                from posts.utils import upload_to_minio
-                minio_object_name = upload_to_minio(temp_path)
-                if minio_object_name:
-                    # Update the profile picture field
-                    profile_form.instance.profile_picture = minio_object_name
-                    os.remove(temp_path)
-                else:
-                    os.remove(temp_path)
-                    messages.error(request, 'Failed to upload profile picture to MinIO. Please try again.')
+                object_name = store_upload(request.FILES['profile_picture'])
+                if not object_name:
+                    messages.error(request, 'Failed to upload profile picture. Please try again.')
                     return render(request, 'users/profile.html', {
                         'user_form': user_form,
                         'profile_form': profile_form,
                     })
+                
+                # Update the profile picture field
+                profile_form.instance.profile_picture = object_name
             
+            user_form.save()
             profile_form.save()
+            # Delete the old profile picture in the background once the row
+            # no longer points at it
+            if old_image_name:
+                transaction.on_commit(lambda: delete_image.delay(old_image_name))
             messages.success(request, 'Profile updated successfully!')
             return redirect('profile')
         else:
@@ -174,17 +169,54 @@ def change_password_view(request):
     return render(request, 'users/change_password.html', {'form': form})
 
 
-@csrf_exempt
-def check_session_view(request):
-    """API endpoint to check if user session is valid (for high availability)"""
+# Most user ids accepted by one check_session_view request
+MAX_SESSION_CHECK_IDS = 1000
+
+
+async def check_sessions(user_ids):
+    """Answer a batch of session checks with a single MGET"""
+    markers = await aget_many([session_marker_key(user_id) for user_id in user_ids])
+    valid, expired = [], []
+    for user_id in user_ids:
+        session_data = markers.get(session_marker_key(user_id))
+        if session_data and session_data.get('is_authenticated'):
+            valid.append(user_id)
+        else:
+            expired.append(user_id)
+    return JsonResponse({'valid': valid, 'expired': expired}, json_dumps_params={'separators': (',', ':')})
+
+
+async def check_session_view(request):
+    """API endpoint to check if user session is valid (for high availability)
+
+    Send ``{"user_id": 1}`` for one user, or ``{"user_ids": [1, 2, 3]}`` to
+    check up to ``MAX_SESSION_CHECK_IDS`` users in one request; the batch
+    answer is ``{"valid": [1, 3], "expired": [2]}``.
+    """
     if request.method == 'POST':
         try:
             data = json.loads(request.body)
+            if not isinstance(data, dict):
+                return JsonResponse({'valid': False, 'message': 'Invalid JSON'})
+            
+            if 'user_ids' in data:
+                user_ids = data['user_ids']
+                if not isinstance(user_ids, list) or not all(
+                    isinstance(user_id, int) and not isinstance(user_id, bool) for user_id in user_ids
+                ):
+                    return JsonResponse({'valid': False, 'message': 'user_ids must be a list of integers'}, status=400)
+                if len(user_ids) > MAX_SESSION_CHECK_IDS:
+                    return JsonResponse(
+                        {'valid': False, 'message': f'At most {MAX_SESSION_CHECK_IDS} user IDs per request'},
+                        status=400
+                    )
+                return await check_sessions(list(dict.fromkeys(user_ids)))
+            
             user_id = data.get('user_id')
             
             if user_id:
-                session_key = f"user_session_{user_id}"
-                session_data = cache.get(session_key)
+                session_key = session_marker_key(user_id)
+                session_data = (await aget_many([session_key])).get(session_key)
                 
                 if session_data and session_data.get('is_authenticated'):
                     return JsonResponse({'valid': True, 'user': session_data})
@@ -198,6 +230,10 @@ def check_session_view(request):
     return JsonResponse({'valid': False, 'message': 'Invalid request method'})
 
 
+# Django 4.2's csrf_exempt() only wraps sync views
+check_session_view.csrf_exempt = True
+
+
 def home_view(request):
     if request.user.is_authenticated:
         return redirect('dashboard')